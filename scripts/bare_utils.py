@@ -51,3 +51,35 @@ def get_sha256(path: Path):
             h.update(block)
 
     return h.hexdigest()
+
+
+VALIDATION_STATUS_FILE_NAME = "validation_status.jsonl"
+PREFETCH_MANIFEST_FILE_NAME = "prefetch_manifest.json"
+
+
+def append_validation_status(index_path: Path, summary_path: Path, summary: Union[Dict[str, Any], list]):
+    """append one json line per (sub) summary of a validation summary file to a validation status index
+
+    Args:
+        index_path: validation status index (in the root of the checked artifact folder)
+        summary_path: path of the written validation summary (stored relative to the index)
+        summary: validation summary (or list of sub summaries)
+    """
+    lines = []
+    for part, s in enumerate([summary] if isinstance(summary, dict) else summary):
+        error = s.get("error")
+        lines.append(
+            json.dumps(
+                dict(
+                    summary=summary_path.relative_to(index_path.parent).as_posix(),
+                    part=part,  # entries of a rewritten summary (starting with part 0) replace previous ones
+                    name=s.get("name"),
+                    status=s.get("status"),
+                    error=None if error is None else str(error),
+                )
+            )
+        )
+
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with index_path.open("a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
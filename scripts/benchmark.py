@@ -0,0 +1,337 @@
+"""end-to-end benchmarks of the collection scripts on synthetic collections
+
+    python scripts/benchmark.py run --sizes 1000 --sizes 10000 --sizes 50000
+    python scripts/benchmark.py compare benchmark_results/<commit a>.json benchmark_results/<commit b>.json
+    python scripts/benchmark.py canonicalize collection  # canonicalize vs. the previous recursive implementation
+
+Generated collections are cached in `data_dir` (they do not depend on the benchmarked code),
+so results of different commits are comparable.
+"""
+import copy
+import dataclasses
+import io
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from bare_utils import DEPLOYED_BASE_URL, get_sha256
+from bioimageio.core import __version__ as core_version
+from bioimageio.spec import __version__ as spec_version
+from ruamel.yaml import comments
+from utils import ADJECTIVES, ANIMALS, enforce_block_style_resource, rec_sort, yaml
+
+app = typer.Typer()
+
+STAGES = ("update_rdfs", "prepare_to_deploy", "generate_collection_rdf_and_thumbnails")
+
+
+def get_synthetic_resource(idx: int, n_versions: int) -> dict:
+    resource_id = f"10.5281/zenodo.{8_000_000 + idx * (n_versions + 1)}"
+    animals = sorted(ANIMALS)
+    resource = {
+        "status": "accepted",
+        "id": resource_id,
+        "doi": resource_id,
+        "owners": [1000 + idx % 13],
+        "versions": [
+            {
+                "version_id": str(8_000_000 + idx * (n_versions + 1) + v + 1),
+                "doi": f"10.5281/zenodo.{8_000_000 + idx * (n_versions + 1) + v + 1}",
+                "created": f"2023-{1 + v % 12:02}-{1 + idx % 28:02} 12:00:00.000000",
+                "status": "accepted",
+                "rdf_source": f"https://zenodo.org/api/records/{8_000_000 + idx * (n_versions + 1) + v + 1}/files/rdf.yaml/content",
+                "name": f"synthetic resource {idx}",
+                "version_name": f"revision {n_versions - v}",
+            }
+            for v in range(n_versions)
+        ],
+    }
+    if idx < len(ADJECTIVES) * len(animals):  # only as many models as there are nicknames
+        animal = animals[idx // len(ADJECTIVES)]
+        resource["type"] = "model"
+        resource["nickname"] = f"{ADJECTIVES[idx % len(ADJECTIVES)]}-{animal}"
+        resource["nickname_icon"] = ANIMALS[animal]
+    else:
+        resource["type"] = "dataset"
+
+    return resource
+
+
+def get_synthetic_rdf(resource: dict, version: dict) -> dict:
+    bioimageio_config = {k: version[k] for k in ("created", "doi", "status", "version_id", "version_name")}
+    bioimageio_config.update({k: resource[k] for k in ("owners", "nickname", "nickname_icon") if k in resource})
+    return {
+        "authors": [{"name": "bioimage.io", "affiliation": "EMBL"}],
+        "cite": [{"text": "synthetic", "doi": resource["doi"]}],
+        "config": {"bioimageio": bioimageio_config},
+        "covers": [f"{DEPLOYED_BASE_URL}/rdfs/{resource['id']}/{version['version_id']}/cover.png"],
+        "description": "a synthetic resource to benchmark the collection scripts " * 4,
+        "documentation": f"https://zenodo.org/api/records/{version['version_id']}/files/README.md/content",
+        "format_version": "0.2.3",
+        "id": f"{resource['id']}/{version['version_id']}",
+        "license": "MIT",
+        "links": ["ilastik/ilastik"],
+        "name": version["name"],
+        "rdf_source": f"{DEPLOYED_BASE_URL}/rdfs/{resource['id']}/{version['version_id']}/rdf.yaml",
+        "tags": ["synthetic", "benchmark", resource["type"]],
+        "type": resource["type"],
+    }
+
+
+def get_synthetic_test_summary(rdf_sha256: str) -> dict:
+    return {
+        "bioimageio_core_version": core_version,
+        "bioimageio_spec_version": spec_version,
+        "rdf_sha256": rdf_sha256,
+        "status": "passed",
+        "tests": {
+            "bioimageio": [
+                {
+                    "bioimageio_spec_version": spec_version,
+                    "error": None,
+                    "name": "bioimageio.spec static validation",
+                    "nested_errors": {},
+                    "status": "passed",
+                    "traceback": None,
+                    "warnings": {},
+                }
+            ]
+        },
+    }
+
+
+@app.command()
+def generate(
+    folder: Path,
+    n_resources: int,
+    n_versions: int = 2,
+    changed_fraction: float = 0.01,
+    seed: int = 0,
+):
+    """generate a synthetic collection, a matching gh-pages and last_ci_run/collection
+
+    A `changed_fraction` of resources differ between collection and last_ci_run/collection.
+    """
+    rng = random.Random(seed)
+    for idx in range(n_resources):
+        resource = get_synthetic_resource(idx, n_versions)
+        r_id = resource["id"]
+        for version in resource["versions"]:
+            rdf_path = folder / "gh-pages" / "rdfs" / r_id / version["version_id"] / "rdf.yaml"
+            rdf_path.parent.mkdir(parents=True, exist_ok=True)
+            yaml.dump(get_synthetic_rdf(resource, version), rdf_path)
+            yaml.dump(get_synthetic_test_summary(get_sha256(rdf_path)), rdf_path.with_name("test_summary.yaml"))
+
+        for subfolder in ("collection", "last_ci_run/collection"):
+            if subfolder != "collection" and rng.random() < changed_fraction:
+                resource = dict(resource, status="pending")
+
+            resource_path = folder / subfolder / r_id / "resource.yaml"
+            resource_path.parent.mkdir(parents=True, exist_ok=True)
+            yaml.dump(enforce_block_style_resource(resource), resource_path)
+
+    (folder / "complete").touch()
+
+
+def run_stage(name: str, data: Path, dist: Path):
+    if name == "update_rdfs":
+        from update_rdfs import main
+
+        main(
+            dist=dist / "updated_rdfs",
+            collection=data / "collection",
+            last_collection=data / "last_ci_run/collection",
+            gh_pages=data / "gh-pages",
+        )
+    elif name == "prepare_to_deploy":
+        from prepare_to_deploy import main
+
+        main(
+            dist=dist / "gh_pages_update",
+            collection=data / "collection",
+            gh_pages=data / "gh-pages",
+            artifact_dir=dist / "artifacts",
+            partner_test_summaries=dist / "partner_test_summaries",
+        )
+    elif name == "generate_collection_rdf_and_thumbnails":
+        from generate_collection_rdf_and_thumbnails import main
+
+        main(collection=data / "collection", gh_pages=data / "gh-pages", dist=dist)
+    else:
+        raise ValueError(f"unknown stage {name}")
+
+
+@app.command()
+def run_one(data: Path, output: Path, stage_name: Optional[str] = typer.Option(None, "--stage")):
+    """run one (or all) benchmarked stages on a generated collection (used by `run` in a fresh process per stage)"""
+    from profiling import STAGES as RECORDS
+    from profiling import stage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in STAGES if stage_name is None else [stage_name]:
+            with stage(name):
+                run_stage(name, data, Path(tmp) / name)
+
+    output.write_text(json.dumps([dataclasses.asdict(r) for r in RECORDS], indent=2), encoding="utf-8")
+
+
+def get_git_commit() -> str:
+    p = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return p.stdout.strip() or "unknown"
+
+
+@app.command()
+def run(
+    sizes: List[int] = typer.Option([1000, 10000, 50000]),
+    data_dir: Path = Path(__file__).parent / "../benchmark_data",
+    output: Optional[Path] = typer.Option(None, help="defaults to benchmark_results/<git commit>.json"),
+):
+    """generate synthetic collections (if not cached) and benchmark the collection scripts on them"""
+    commit = get_git_commit()
+    if output is None:
+        output = Path(__file__).parent / f"../benchmark_results/{commit}.json"
+
+    results = dict(commit=commit, python=platform.python_version(), spec=spec_version, core=core_version, sizes={})
+    for size in sizes:
+        data = data_dir / str(size)
+        if not (data / "complete").exists():
+            if data.exists():
+                shutil.rmtree(data)
+
+            print(f"generating synthetic collection with {size} resources in {data}")
+            generate(data, size)
+
+        print(f"benchmarking {size} resources")
+        records = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in STAGES:  # a fresh process per stage, so the peak rss is that of the stage alone
+                stage_output = Path(tmp) / f"{name}.json"
+                subprocess.run(
+                    [sys.executable, __file__, "run-one", str(data), str(stage_output), "--stage", name],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                )
+                records += json.loads(stage_output.read_text(encoding="utf-8"))
+
+        results["sizes"][size] = {
+            r["name"]: dict(
+                wall_time=r["wall_time"],
+                cpu_time=r["cpu_time"],
+                resources_per_s=size / r["wall_time"] if r["wall_time"] else None,
+                yaml_loads=r["yaml_loads"],
+                yaml_dumps=r["yaml_dumps"],
+                peak_rss_kb=r["peak_rss_kb"],
+            )
+            for r in records
+        }
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"results written to {output}")
+    compare([output])
+
+
+@app.command()
+def compare(result_paths: List[Path]):
+    """print benchmark results (of one or more commits) side by side"""
+    results = [json.loads(p.read_text(encoding="utf-8")) for p in result_paths]
+    header = (
+        ["size", "stage"] + [f"{r['commit']} [s]" for r in results] + [f"{r['commit']} peak rss [MB]" for r in results]
+    )
+    rows = []
+    sizes = sorted({s for r in results for s in r["sizes"]}, key=int)
+    for size in sizes:
+        for name in STAGES:
+            stats = [r["sizes"].get(size, {}).get(name) for r in results]
+            rows.append(
+                [size, name]
+                + ["-" if s is None else f"{s['wall_time']:.2f}" for s in stats]
+                + ["-" if s is None or s["peak_rss_kb"] is None else f"{s['peak_rss_kb'] / 1024:.0f}" for s in stats]
+            )
+
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)).rstrip())
+
+
+def legacy_rec_sort(obj):
+    if isinstance(obj, dict):
+        return {k: legacy_rec_sort(obj[k]) for k in sorted(obj)}
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)([legacy_rec_sort(v) for v in obj])
+    else:
+        return obj
+
+
+def legacy_enforce_block_style(data):
+    if isinstance(data, list):
+        converted = comments.CommentedSeq([legacy_enforce_block_style(d) for d in data])
+    elif isinstance(data, dict):
+        converted = comments.CommentedMap(
+            {legacy_enforce_block_style(k): legacy_enforce_block_style(v) for k, v in data.items()}
+        )
+    else:
+        return data
+
+    converted.fa.set_block_style()
+    return converted
+
+
+def legacy_enforce_block_style_resource(resource: dict):
+    resource = legacy_rec_sort(copy.deepcopy(resource))
+    rdf_sources = [v.pop("rdf_source") for v in resource.get("versions", [])]
+    resource = legacy_enforce_block_style(resource)
+    for i in range(len(rdf_sources)):
+        resource["versions"][i]["rdf_source"] = rdf_sources[i]
+
+    return resource
+
+
+def dump_to_str(data) -> str:
+    stream = io.StringIO()
+    yaml.dump(data, stream)
+    return stream.getvalue()
+
+
+@app.command("canonicalize")
+def benchmark_canonicalize(collection: Path, gh_pages: Optional[Path] = None, repeat: int = 5):
+    """time rec_sort and enforce_block_style_resource against their previous recursive implementations
+
+    On all resource.yaml files in `collection` (and rdf.yaml files in `gh_pages`); outputs are checked to be identical.
+    """
+    resources = [yaml.load(p) for p in sorted(collection.glob("**/resource.yaml"))]
+    rdfs = [] if gh_pages is None else [yaml.load(p) for p in sorted(gh_pages.glob("rdfs/**/rdf.yaml"))]
+    cases = [
+        ("enforce_block_style_resource", resources, legacy_enforce_block_style_resource, enforce_block_style_resource),
+        ("rec_sort", resources + rdfs, legacy_rec_sort, rec_sort),
+    ]
+    print(f"{len(resources)} resources, {len(rdfs)} rdfs")
+    for name, data, legacy, current in cases:
+        for d in data:
+            assert dump_to_str(legacy(d)) == dump_to_str(current(d)), f"{name} output differs"
+
+        timings = []
+        for func in (legacy, current):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for d in data:
+                    func(d)
+
+                best = min(best, time.perf_counter() - start)
+
+            timings.append(best)
+
+        print(f"{name}: {timings[0] * 1000:.1f} ms (recursive) -> {timings[1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,27 +1,79 @@
+import json
 import os
 from pathlib import Path
-from pprint import pprint
+from typing import Dict, List
 
 import typer
 
+from bare_utils import VALIDATION_STATUS_FILE_NAME
 from bioimageio.spec.shared import yaml
 
 
-def main(artifact_dir: Path = typer.Argument(..., help="folder with validation artifacts")):
-    """check validation summaries in artifact folder"""
-    failed_val = []
+def read_validation_status(index_path: Path) -> List[Dict[str, str]]:
+    """status entries of the latest version of each validation summary listed in a validation status index"""
+    entries: Dict[str, List[Dict[str, str]]] = {}
+    with index_path.open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            entry = json.loads(line)
+            if entry["part"] == 0:
+                entries[entry["summary"]] = []
+
+            entries[entry["summary"]].append(entry)
+
+    return [e for summary_entries in entries.values() for e in summary_entries]
+
+
+def glob_validation_status(artifact_dir: Path) -> List[Dict[str, str]]:
+    """status entries from validation summaries (for artifacts without a validation status index)"""
+    entries = []
     for sp in sorted(artifact_dir.glob("**/validation_summary*.yaml"), key=os.path.getmtime):
         summary = yaml.load(sp)
         if isinstance(summary, dict):
             summary = [summary]
 
         for s in summary:
-            if s["status"] != "passed":
-                s["id"] = sp.stem
-                failed_val.append(summary)
+            error = s.get("error")
+            entries.append(
+                dict(
+                    summary=sp.relative_to(artifact_dir).as_posix(),
+                    name=s.get("name"),
+                    status=s["status"],
+                    error=None if error is None else str(error),
+                )
+            )
+
+    return entries
+
+
+def format_failures(failed: List[Dict[str, str]], max_error_length: int = 100) -> str:
+    header = ["summary", "name", "error"]
+    rows = []
+    for entry in failed:
+        error = (entry.get("error") or "").strip().replace("\n", " ")
+        if len(error) > max_error_length:
+            error = error[: max_error_length - 3] + "..."
+
+        rows.append([entry["summary"], str(entry.get("name")), error])
+
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    return "\n".join("  ".join(c.ljust(w) for c, w in zip(row, widths)).rstrip() for row in [header] + rows)
+
+
+def main(artifact_dir: Path = typer.Argument(..., help="folder with validation artifacts")):
+    """check validation summaries in artifact folder"""
+    index_path = artifact_dir / VALIDATION_STATUS_FILE_NAME
+    if index_path.exists():
+        entries = read_validation_status(index_path)
+    else:
+        entries = glob_validation_status(artifact_dir)
 
-    if failed_val:
-        pprint(failed_val, width=120)
+    failed = [e for e in entries if e["status"] != "passed"]
+    print(f"{len(entries) - len(failed)} of {len(entries)} validations passed")
+    if failed:
+        print(format_failures(failed))
         raise typer.Exit(code=1)
 
 
@@ -0,0 +1,132 @@
+"""deploy only changed files
+
+Files are compared by content hash with the deployed tree; changed files are hardlinked (or copied if hardlinks are
+not possible, e.g. across file systems) to their target location. A manifest lists added, changed and removed files.
+
+    python scripts/deploy.py prune dist gh-pages --manifest deploy_manifest.json
+
+removes all files from dist that are unchanged compared to gh-pages (to deploy only changes with
+a deploy action that does not clean its target).
+"""
+import dataclasses
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import typer
+from bare_utils import get_sha256
+
+app = typer.Typer()
+
+
+@dataclasses.dataclass
+class DeployManifest:
+    added: List[str] = dataclasses.field(default_factory=list)
+    changed: List[str] = dataclasses.field(default_factory=list)
+    removed: List[str] = dataclasses.field(default_factory=list)
+    unchanged: int = 0
+
+    def write(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(dataclasses.asdict(self), indent=2, sort_keys=True), encoding="utf-8")
+
+    def __str__(self):
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed, "
+            f"{self.unchanged} unchanged files"
+        )
+
+
+def iterate_files(folder: Path) -> Iterator[Path]:
+    """all files in folder (recursively), except for git internals"""
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for f in files:
+            yield Path(root) / f
+
+
+def is_unchanged(src: Path, dst: Path) -> bool:
+    if not dst.exists():
+        return False
+
+    if src.stat().st_size != dst.stat().st_size:
+        return False
+
+    if os.path.samefile(src, dst):
+        return True
+
+    return get_sha256(src) == get_sha256(dst)
+
+
+def link_or_copy(src: Path, dst: Path):
+    """place src at dst as hardlink (or copy); replaces dst instead of writing into it (it might be hardlinked)"""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def deploy(src: Path, dst: Path, *, clean: bool = False, manifest_path: Optional[Path] = None) -> DeployManifest:
+    """deploy changed files from src to dst
+
+    Args:
+        src: folder to deploy
+        dst: deployed folder
+        clean: remove files from dst that are not in src
+        manifest_path: optional path to write the deploy manifest to
+    """
+    manifest = DeployManifest()
+    src_files = set()
+    if src.exists():
+        for src_file in iterate_files(src):
+            rel = src_file.relative_to(src)
+            src_files.add(rel)
+            dst_file = dst / rel
+            if is_unchanged(src_file, dst_file):
+                manifest.unchanged += 1
+                continue
+
+            (manifest.changed if dst_file.exists() else manifest.added).append(rel.as_posix())
+            link_or_copy(src_file, dst_file)
+
+    if clean and dst.exists():
+        for dst_file in list(iterate_files(dst)):
+            rel = dst_file.relative_to(dst)
+            if rel not in src_files:
+                dst_file.unlink()
+                manifest.removed.append(rel.as_posix())
+
+    if manifest_path is not None:
+        manifest.write(manifest_path)
+
+    return manifest
+
+
+@app.command()
+def prune(src: Path, deployed: Path, manifest: Optional[Path] = None):
+    """remove files from src that are unchanged compared to (already) deployed"""
+    deploy_manifest = DeployManifest()
+    for src_file in list(iterate_files(src)):
+        rel = src_file.relative_to(src)
+        if is_unchanged(src_file, deployed / rel):
+            src_file.unlink()
+            deploy_manifest.unchanged += 1
+        elif (deployed / rel).exists():
+            deploy_manifest.changed.append(rel.as_posix())
+        else:
+            deploy_manifest.added.append(rel.as_posix())
+
+    if manifest is not None:
+        deploy_manifest.write(manifest)
+
+    print(f"to deploy: {deploy_manifest}")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,16 +1,12 @@
 import argparse
-import subprocess
 from pprint import pprint
 
 from bare_utils import set_gh_actions_output
+from git_refs import get_branches
 
 
 def main(prefix: str):
-    subprocess.run(["git", "fetch"])
-    remote_branch_proc = subprocess.run(["git", "branch", "-r"], capture_output=True, text=True)
-    remote_branches = [
-        rb[len(f"origin/{prefix}") :] for rb in remote_branch_proc.stdout.split() if rb.startswith(f"origin/{prefix}")
-    ]
+    remote_branches = [b[len(prefix) :] for b in get_branches(prefix)]
     print(f"Found remote {prefix} branches of:")
     pprint(remote_branches)
 
@@ -1,22 +1,160 @@
+import hashlib
+import json
+import threading
 import warnings
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
 
 import typer
 from bioimageio.spec.shared import resolve_source
+from deploy import link_or_copy
+from http_client import HttpClient
 from tqdm import tqdm
 from utils import yaml
 
+DOCUMENTATION_CACHE = Path(__file__).parent / "../.cache/documentation"
+
+
+def is_immutable(uri: str) -> bool:
+    """files of published zenodo records cannot change"""
+    parts = urlsplit(uri)
+    return parts.netloc == "zenodo.org" and parts.path.startswith("/api/records/") and "/files/" in parts.path
+
+
+class DocumentationCache:
+    """content-addressed cache of documentation files with an index keyed by documentation URI"""
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self.index_path = folder / "index.json"
+        if self.index_path.exists():
+            self.index: Dict[str, Dict[str, Optional[str]]] = json.loads(self.index_path.read_text(encoding="utf-8"))
+        else:
+            self.index = {}
+
+        self._lock = threading.Lock()
+
+    def get_blob_path(self, sha256: str) -> Path:
+        return self.folder / "blobs" / sha256
+
+    def get(self, uri: str) -> Optional[Dict[str, Optional[str]]]:
+        """cache entry of `uri` (if its content is still cached)"""
+        with self._lock:
+            entry = self.index.get(uri)
+
+        if entry is None or not self.get_blob_path(entry["sha256"]).exists():
+            return None
+
+        return entry
+
+    def put(self, uri: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Path:
+        sha256 = hashlib.sha256(content).hexdigest()
+        blob_path = self.get_blob_path(sha256)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_name(f"{sha256}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(content)
+            tmp_path.replace(blob_path)
+
+        with self._lock:
+            self.index[uri] = dict(sha256=sha256, etag=etag, last_modified=last_modified)
+
+        return blob_path
+
+    def save(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self.index_path.write_text(json.dumps(self.index, indent=2, sort_keys=True), encoding="utf-8")
+
+
+class DocumentationFetcher:
+    """fetch documentation files concurrently (with retries, a bounded number of connections per host and circuit
+    breakers, see `http_client.HttpClient`)"""
+
+    def __init__(
+        self, cache: DocumentationCache, max_workers: int, max_per_host: int, client: Optional[HttpClient] = None
+    ):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.client = client or HttpClient(max_concurrency_per_host=max_per_host)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def fetch(self, uri: str) -> Path:
+        """path to the (cached) content of `uri`"""
+        entry = self.cache.get(uri)
+        if entry is not None and is_immutable(uri):
+            self.count("cached")
+            return self.cache.get_blob_path(entry["sha256"])
+
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        r = self.client.get(uri, headers=headers)
+
+        if r.status_code == 304 and entry is not None:
+            self.count("not modified")
+            return self.cache.get_blob_path(entry["sha256"])
+
+        r.raise_for_status()
+        self.count("downloaded")
+        return self.cache.put(uri, r.content, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+
+    def deploy(self, doc_uri: str, outputs: List[Path]):
+        """fetch `doc_uri` once and place it at all `outputs`"""
+        try:
+            if urlsplit(doc_uri).scheme in ("http", "https"):
+                content_path = self.fetch(doc_uri)
+            else:
+                content_path = outputs[0]
+                resolve_source(doc_uri, output=content_path, pbar=partial(tqdm, disable=True))
+                self.count("resolved")
+        except Exception as e:
+            warnings.warn(f"failed to resolve doc_ui: {e}")
+            self.count("failed")
+            for output in outputs:
+                _ = output.with_name("documentation.md").write_text(doc_uri)
+
+            return
+
+        for output in outputs:
+            if output != content_path:
+                link_or_copy(content_path, output)
+
+    def deploy_all(self, documentation: Dict[str, List[Path]]):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for _ in executor.map(lambda item: self.deploy(*item), documentation.items()):
+                pass
+
 
 def main(
     folder: Path = Path(__file__).parent
     / "../dist",  # nested folders with rdf.yaml files
+    cache: Path = DOCUMENTATION_CACHE,
+    max_workers: int = 16,
+    max_per_host: int = 4,
 ):
-    """Download the documentation file for every rdf.yaml found in (subfolders of) folder"""
+    """Download the documentation file for every rdf.yaml found in (subfolders of) folder
+
+    Each documentation URI is fetched once (and only if changed compared to its cached content);
+    versions sharing a documentation file get a hardlink of it.
+    """
     if not folder.exists():
         warnings.warn(f"{folder} not found")
         return
 
+    documentation: Dict[str, List[Path]] = defaultdict(list)
     for rdf_path in folder.glob("**/rdf.yaml"):
         rdf = yaml.load(rdf_path)
         if not isinstance(rdf, dict):
@@ -33,15 +171,13 @@ def main(
         else:
             type_ext = "md"
 
-        try:
-            resolve_source(
-                doc_uri,
-                output=rdf_path.with_name(f"documentation.{type_ext}"),
-                pbar=partial(tqdm, disable=True),
-            )
-        except Exception as e:
-            warnings.warn(f"failed to resolve doc_ui: {e}")
-            _ = rdf_path.with_name("documentation.md").write_text(doc_uri)
+        documentation[doc_uri].append(rdf_path.with_name(f"documentation.{type_ext}"))
+
+    fetcher = DocumentationFetcher(DocumentationCache(cache), max_workers=max_workers, max_per_host=max_per_host)
+    fetcher.deploy_all(documentation)
+    fetcher.cache.save()
+    n_files = sum(len(outputs) for outputs in documentation.values())
+    print(f"{n_files} documentation files from {len(documentation)} unique URIs: {dict(fetcher.counts)}")
 
 
 if __name__ == "__main__":
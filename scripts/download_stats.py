@@ -0,0 +1,151 @@
+"""columnar download statistics of zenodo records
+
+The statistics table is a numpy structured array with one row per harvested zenodo record (version).
+Records are identified by their zenodo record ids (DOIs are 10.5281/zenodo.<record id>) and resource types are stored
+as codes into `RESOURCE_TYPES`, so that a row takes 49 bytes.
+Each day's snapshot is persisted as a compressed .npz file in a folder of daily snapshots (<YYYY-MM-DD>.npz); a harvest
+only (re)writes the snapshot of its day, so the history of earlier days can be analyzed without re-harvesting, but is
+never loaded or rewritten.
+"""
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+
+DOWNLOAD_STATS_FILE_NAME = "download_stats"  # folder of daily snapshots
+
+ZENODO_DOI_PREFIX = "10.5281/zenodo."
+RESOURCE_TYPES = ("unknown", "model", "dataset", "application", "notebook", "collection", "other")
+
+STATS_DTYPE = numpy.dtype(
+    [
+        ("harvested", "datetime64[D]"),
+        ("concept_recid", "u4"),
+        ("recid", "u4"),
+        ("type", "u1"),  # index into RESOURCE_TYPES
+        ("created", "datetime64[s]"),
+        ("unique_downloads", "i8"),  # -1 if unknown
+        ("version_volume", "i8"),  # -1 if unknown
+        ("total_size", "i8"),
+    ]
+)
+
+
+def get_record_id(doi: str) -> int:
+    """zenodo record id of a zenodo DOI"""
+    if not doi.startswith(ZENODO_DOI_PREFIX):
+        raise ValueError(f"not a zenodo DOI: {doi}")
+
+    return int(doi[len(ZENODO_DOI_PREFIX) :])
+
+
+def get_doi(record_id: int) -> str:
+    return f"{ZENODO_DOI_PREFIX}{record_id}"
+
+
+def get_type_code(resource_type: Optional[str]) -> int:
+    if resource_type is None:
+        return 0
+    elif resource_type in RESOURCE_TYPES:
+        return RESOURCE_TYPES.index(resource_type)
+    else:
+        return RESOURCE_TYPES.index("other")
+
+
+class DownloadStatsBuilder:
+    """collect download statistics of zenodo hits while harvesting"""
+
+    def __init__(self, harvested: Optional[datetime] = None):
+        self.harvested = numpy.datetime64((harvested or datetime.now()).date(), "D")
+        self.rows: List[Tuple] = []
+
+    def append_hit(self, hit: dict, resource_type: Optional[str] = None):
+        stats = hit.get("stats") or {}
+        try:
+            unique_downloads = int(stats["unique_downloads"])
+        except Exception as e:
+            warnings.warn(f"Could not determine download count: {e}")
+            unique_downloads = -1
+
+        self.rows.append(
+            (
+                self.harvested,
+                get_record_id(hit["conceptdoi"]),
+                get_record_id(hit["doi"]),
+                get_type_code(resource_type),
+                numpy.datetime64(datetime.fromisoformat(hit["created"]).replace(tzinfo=None), "s"),
+                unique_downloads,
+                int(stats.get("version_volume", -1)),
+                sum(f.get("size", 0) for f in hit.get("files", [])),
+            )
+        )
+
+    def to_table(self) -> numpy.ndarray:
+        return numpy.array(self.rows, dtype=STATS_DTYPE)
+
+
+def _oldest_version_per_concept(table: numpy.ndarray) -> Tuple[List[str], numpy.ndarray]:
+    """unique concept dois and the row indices of their oldest version
+
+    (a harvest sorted by 'newest' assigns the stats of the oldest version last)
+    """
+    order = numpy.lexsort((table["created"], table["concept_recid"]))
+    concepts, first = numpy.unique(table["concept_recid"][order], return_index=True)
+    return [get_doi(c) for c in concepts.tolist()], order[first]
+
+
+def get_download_counts(table: numpy.ndarray, offsets: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """download count per concept doi (unknown counts default to 1) plus optional offsets"""
+    concepts, rows = _oldest_version_per_concept(table)
+    counts = table["unique_downloads"][rows]
+    counts = numpy.where(counts < 0, 1, counts)
+    if offsets:
+        counts = counts + numpy.array([offsets.get(c, 0) for c in concepts], dtype=counts.dtype)
+
+    return dict(zip(concepts, counts.tolist()))
+
+
+def compute_download_counts_offsets(table: numpy.ndarray) -> Dict[str, int]:
+    """offset between downloaded volume / total file size and unique downloads per concept doi"""
+    valid = (table["total_size"] > 0) & (table["version_volume"] >= 0) & (table["unique_downloads"] >= 0)
+    table = table[valid]
+    concepts, rows = _oldest_version_per_concept(table)
+    desired = numpy.round(table["version_volume"][rows] / table["total_size"][rows]).astype("i8")
+    return dict(zip(concepts, (desired - table["unique_downloads"][rows]).tolist()))
+
+
+def aggregate_per_type(download_counts: Dict[str, int], table: numpy.ndarray) -> Dict[str, int]:
+    """sum of download counts per resource type"""
+    concepts, rows = _oldest_version_per_concept(table)
+    counts = numpy.array([download_counts.get(c, 0) for c in concepts], dtype="i8")
+    types = table["type"][rows]
+    per_type = numpy.bincount(types, weights=counts, minlength=len(RESOURCE_TYPES)).astype("i8")
+    present = numpy.bincount(types, minlength=len(RESOURCE_TYPES)) > 0
+    return {t: c for t, c, p in zip(RESOURCE_TYPES, per_type.tolist(), present.tolist()) if p}
+
+
+def load_stats(folder: Path, day: Optional[str] = None) -> numpy.ndarray:
+    """snapshot of `day` (YYYY-MM-DD) or the latest snapshot in `folder` (empty if there is none)"""
+    if day is None:
+        snapshots = sorted(folder.glob("*.npz")) if folder.is_dir() else []
+        path = snapshots[-1] if snapshots else None
+    else:
+        path = folder / f"{day}.npz"
+
+    if path is None or not path.exists():
+        return numpy.empty(0, dtype=STATS_DTYPE)
+
+    with numpy.load(path) as data:
+        return data["stats"]
+
+
+def save_stats(table: numpy.ndarray, folder: Path):
+    """save `table` as the snapshot of the day it was harvested (replacing a previous snapshot of that day)"""
+    days = numpy.unique(table["harvested"])
+    if len(days) != 1:
+        raise ValueError(f"expected a snapshot of one day, but got rows harvested on {days.tolist()}")
+
+    folder.mkdir(parents=True, exist_ok=True)
+    numpy.savez_compressed(folder / f"{days[0]}.npz", stats=table)
@@ -1,3 +1,4 @@
+import json
 import traceback
 from functools import partialmethod
 from pathlib import Path
@@ -7,8 +8,17 @@ import typer
 from marshmallow import missing
 from tqdm import tqdm
 
+from bare_utils import VALIDATION_STATUS_FILE_NAME, append_validation_status
 from bioimageio.spec import load_raw_resource_description
 from bioimageio.spec.shared import yaml
+from validation_cache import (
+    CACHED_RESULTS_FILE_NAME,
+    CACHE_ENTRY_FILE_NAME,
+    DEFAULT_CORE_COMPATIBILITY,
+    find_cached_summary,
+    get_fingerprint,
+    make_cache_entry,
+)
 
 tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)  # silence tqdm
 
@@ -19,6 +29,11 @@ def test_summary_from_exception(name, exception):
     )
 
 
+def get_status(summary) -> str:
+    summaries = summary if isinstance(summary, list) else [summary]
+    return "passed" if summaries and all(s.get("status") == "passed" for s in summaries) else "failed"
+
+
 def main(
     dist: Path,
     resource_id: str,
@@ -28,6 +43,8 @@ def main(
     create_env_outcome: str = "success",
     # rdf_source might assume a resource has been deployed, if not (e.g. in a PR), rdf_source is expected to be invalid.
     ignore_rdf_source_field_in_validation: bool = False,
+    # reuse cached results of bioimageio.core versions compatible according to this policy ('exact' or 'patch')
+    core_compatibility: str = DEFAULT_CORE_COMPATIBILITY,
 ):
     if weight_format is None:
         # no dynamic tests for non-model resources...
@@ -52,14 +69,35 @@ def main(
             except Exception as e:
                 summary = test_summary_from_exception("check for test kwargs", e)
             else:
-                try:
-                    rd = load_raw_resource_description(rdf_path)
-                    if ignore_rdf_source_field_in_validation:
-                        rd.rdf_source = missing
+                from bioimageio.core import __version__ as core_version
+
+                fingerprint = get_fingerprint(root, resource_id, version_id, weight_format)
+                cached_results_path = root / resource_id / version_id / CACHED_RESULTS_FILE_NAME
+                if fingerprint is not None and cached_results_path.exists():
+                    cached_results = json.loads(cached_results_path.read_text(encoding="utf-8"))
+                    summary = find_cached_summary(cached_results, fingerprint, core_version, core_compatibility)
+                else:
+                    summary = None
+
+                if summary is None:
+                    try:
+                        rd = load_raw_resource_description(rdf_path)
+                        if ignore_rdf_source_field_in_validation:
+                            rd.rdf_source = missing
+
+                        summary = test_resource(rd, weight_format=weight_format, **test_kwargs)
+                    except Exception as e:
+                        summary = test_summary_from_exception("call 'test_resource'", e)
 
-                    summary = test_resource(rd, weight_format=weight_format, **test_kwargs)
-                except Exception as e:
-                    summary = test_summary_from_exception("call 'test_resource'", e)
+                    if fingerprint is not None and get_status(summary) == "passed":
+                        cache_entry = make_cache_entry(resource_id, version_id, fingerprint, core_version, summary)
+                        cache_entry_path = dist / resource_id / version_id / weight_format / CACHE_ENTRY_FILE_NAME
+                        cache_entry_path.parent.mkdir(parents=True, exist_ok=True)
+                        cache_entry_path.write_text(
+                            json.dumps(cache_entry, indent=2, sort_keys=True, default=str), encoding="utf-8"
+                        )
+                else:
+                    print(f"reusing cached dynamic validation result (inputs unchanged, core {core_version})")
 
     else:
         env_path = root / resource_id / version_id / f"conda_env_{weight_format}.yaml"
@@ -73,6 +111,8 @@ def main(
     summary_path = dist / resource_id / version_id / weight_format / f"validation_summary_{weight_format}.yaml"
     summary_path.parent.mkdir(parents=True, exist_ok=True)
     yaml.dump(summary, summary_path)
+    # index in the uploaded (and checked) artifact folder of this test case
+    append_validation_status(summary_path.parent / VALIDATION_STATUS_FILE_NAME, summary_path, summary)
 
 
 if __name__ == "__main__":
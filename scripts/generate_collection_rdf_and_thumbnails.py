@@ -1,15 +1,15 @@
 import json
-import shutil
 import warnings
-from datetime import datetime
 from pathlib import Path
 from pprint import pprint
 from typing import Optional
 
 import typer
 from bioimageio.spec.shared import yaml
-from boltons.iterutils import remap
-from utils import deploy_thumbnails, iterate_known_resources, load_yaml_dict, rec_sort
+from deploy import link_or_copy
+from json_encoding import dump_json
+from profiling import items
+from utils import UniquenessIndex, deploy_thumbnails, iterate_known_resources, load_yaml_dict, rec_sort
 
 SUMMARY_FIELDS = (
     "authors",
@@ -70,6 +70,7 @@ def main(
     rdf_template_path: Path = Path(__file__).parent
     / "../collection_rdf_template.yaml",  # todo: rename (not a valid rdf)
     dist: Path = Path(__file__).parent / "../dist",
+    json_backend: str = "json",  # 'orjson' is faster, but its output is not byte-identical
 ):
     rdf = yaml.load(rdf_template_path)
     rdf["collection"] = rdf.get("collection", [])
@@ -95,7 +96,8 @@ def main(
 
     n_accepted = {}
     n_accepted_versions = {}
-    for r in iterate_known_resources(collection=collection, gh_pages=gh_pages):
+    index = UniquenessIndex()
+    for r in items(iterate_known_resources(collection=collection, gh_pages=gh_pages), lambda r: r.resource_id):
         latest_version = None
         version_id: Optional[str] = None
         for version_info in r.info.get("versions", []):
@@ -142,6 +144,7 @@ def main(
 
         deploy_thumbnails(summary, dist, gh_pages, r.resource_id, version_id)
         rdf["collection"].append(summary)
+        index.add_resource(summary, r.path)
         type_ = latest_version.get("type", "unknown")
         n_accepted[type_] = n_accepted.get(type_, 0) + 1
         n_accepted_versions[type_] = n_accepted_versions.get(type_, 0) + 1 + len(latest_version["versions"])
@@ -156,11 +159,8 @@ def main(
     rdf["config"]["n_resources"] = n_accepted
     rdf["config"]["n_resource_versions"] = n_accepted_versions
 
-    # check for unique nicknames
-    nicknames = [e["nickname"] for e in rdf["collection"] if "nickname" in e]
-    duplicate_nicknames = [nick for i, nick in enumerate(nicknames) if nick in nicknames[:i]]
-    if duplicate_nicknames:
-        raise ValueError(f"Duplicate nicknames: {duplicate_nicknames}")
+    # check for unique nicknames and ids
+    index.raise_for_conflicts()
 
     # sort collection
     rdf["collection"].sort(key=lambda c: -c["download_count"])
@@ -170,28 +170,11 @@ def main(
     collection_file_path.parent.mkdir(exist_ok=True)
     yaml.dump(rec_sort(rdf), collection_file_path)
 
-    def convert_for_json(p, k, v):
-        """convert anything not json compatible"""
-        # replace nans
-        number_strings = ["-inf", "inf", "nan"]
-        for n in number_strings:
-            if v == float(n):
-                return k, n
-
-        if isinstance(v, datetime):
-            return k, v.isoformat()
-
-        return True
-
     collection_file_path = dist / "collection.json"
-    rdf = remap(rdf, convert_for_json)
     collection_file_path.parent.mkdir(exist_ok=True)
-    with open(collection_file_path, "w") as f:
-        json.dump(rdf, f, allow_nan=False, indent=2, sort_keys=True)
+    dump_json(rdf, collection_file_path, backend=json_backend)
 
-    shutil.copy(
-        str(collection_file_path), str(collection_file_path.with_name("rdf.json"))
-    )  # deprecated; todo: 'rdf.json'
+    link_or_copy(collection_file_path, collection_file_path.with_name("rdf.json"))  # deprecated; todo: 'rdf.json'
 
 
 if __name__ == "__main__":
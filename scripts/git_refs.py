@@ -0,0 +1,64 @@
+"""cached listing of git refs
+
+Refs of a remote are listed once per process, with `git ls-remote` or, for a local repository path, directly from its
+loose and packed refs (without fetching anything).
+
+    get_branches("auto-update-")  # names of all branches of 'origin' starting with 'auto-update-'
+    get_branches("auto-update-", remote="path/to/bare/repo.git")
+"""
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+
+def read_local_refs(git_dir: Path) -> Dict[str, str]:
+    """refs of a local (bare) repository from its packed-refs file and loose refs"""
+    if (git_dir / ".git").is_dir():
+        git_dir = git_dir / ".git"
+
+    refs = {}
+    packed_refs = git_dir / "packed-refs"
+    if packed_refs.exists():
+        for line in packed_refs.read_text(encoding="utf-8").splitlines():
+            if not line or line.startswith(("#", "^")):  # skip header and peeled tags
+                continue
+
+            sha, name = line.split(" ", 1)
+            refs[name] = sha
+
+    # loose refs take precedence over packed refs
+    for ref_path in (git_dir / "refs").glob("**/*"):
+        if ref_path.is_file():
+            refs[ref_path.relative_to(git_dir).as_posix()] = ref_path.read_text(encoding="utf-8").strip()
+
+    return refs
+
+
+def ls_remote(remote: str) -> Dict[str, str]:
+    p = subprocess.run(["git", "ls-remote", "--refs", remote], capture_output=True, text=True)
+    if p.returncode:
+        # an empty listing would be mistaken for a remote without any branches
+        raise RuntimeError(f"Could not list refs of {remote}: {p.stderr.strip()}")
+
+    refs = {}
+    for line in p.stdout.splitlines():
+        sha, name = line.split("\t", 1)
+        refs[name] = sha
+
+    return refs
+
+
+@lru_cache(maxsize=None)
+def get_refs(remote: str = "origin") -> Dict[str, str]:
+    """ref name -> commit sha of all refs of `remote` (name or url of a remote, or path to a local repository)"""
+    if Path(remote).is_dir():
+        return read_local_refs(Path(remote))
+    else:
+        return ls_remote(remote)
+
+
+def get_branches(prefix: str = "", remote: str = "origin") -> List[str]:
+    """names of branches starting with `prefix`"""
+    heads = "refs/heads/"
+    return sorted(name[len(heads) :] for name in get_refs(remote) if name.startswith(heads + prefix))
@@ -0,0 +1,199 @@
+"""shared http client for outbound requests: retries with backoff, per host concurrency limits and circuit breakers
+
+Retryable responses (429, 5xx, GitHub's exhausted rate limit) and connection errors are retried with jittered
+exponential backoff, or after the time given by `Retry-After`/`X-RateLimit-Reset` headers. The number of concurrent
+requests per host is halved on failures and slowly increased again on successes. After `failure_threshold`
+consecutive failures a host's circuit opens and requests to it fail fast for `cooldown` seconds.
+Requests without an explicit `timeout` use the client's default timeout, so stalled connections are retried as well.
+
+    from http_client import http_get
+    r = http_get("https://zenodo.org/api/records?q=keywords:bioimage.io")  # drop-in for requests.get
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """raised for requests to a host whose circuit is open"""
+
+
+def get_retry_after(r: requests.Response, now: Optional[float] = None) -> Optional[float]:
+    """seconds to wait before retrying according to the `Retry-After` or (exhausted) rate limit headers"""
+    now = time.time() if now is None else now
+    retry_after = r.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - now)
+            except (TypeError, ValueError):
+                return None
+
+    if r.headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in r.headers:
+        try:
+            return max(0.0, float(r.headers["X-RateLimit-Reset"]) - now)
+        except ValueError:
+            return None
+
+    return None
+
+
+def is_retryable(r: requests.Response) -> bool:
+    return r.status_code in RETRY_STATUS_CODES or (
+        r.status_code == 403 and r.headers.get("X-RateLimit-Remaining") == "0"
+    )
+
+
+class HostState:
+    """concurrency limit (additive increase, multiplicative decrease) and circuit breaker of one host"""
+
+    def __init__(self, max_concurrency: int, failure_threshold: int, cooldown: float):
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.active = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.half_open_probe = False
+        self.paused_until = 0.0  # no requests before (rate limit)
+        self.condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        """wait for a free slot; returns whether the request probes a host with an open circuit"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                circuit_open = self.consecutive_failures >= self.failure_threshold
+                if circuit_open and (now < self.open_until or self.half_open_probe):
+                    raise CircuitOpenError(f"circuit open after {self.consecutive_failures} consecutive failures")
+
+                if self.active < max(1, int(self.concurrency)) and now >= self.paused_until:
+                    self.active += 1
+                    self.half_open_probe = circuit_open
+                    return circuit_open
+
+                self.condition.wait(timeout=max(0.01, self.paused_until - now))
+
+    def release(self, probe: bool, success: bool, pause: Optional[float] = None):
+        with self.condition:
+            self.active -= 1
+            if probe:
+                self.half_open_probe = False
+
+            if pause:
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+            if success:
+                self.consecutive_failures = 0
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            else:
+                self.consecutive_failures += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+                if self.consecutive_failures >= self.failure_threshold:
+                    self.open_until = time.monotonic() + self.cooldown
+
+            self.condition.notify_all()
+
+
+class HttpClient:
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_concurrency_per_host: int = 8,
+        failure_threshold: int = 10,
+        cooldown: float = 120.0,
+        timeout: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.timeout = timeout
+        self.sleep = sleep
+        self.hosts: Dict[str, HostState] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+
+        return self._local.session
+
+    def get_host_state(self, host: str) -> HostState:
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostState(self.max_concurrency_per_host, self.failure_threshold, self.cooldown)
+
+            return self.hosts[host]
+
+    def get_backoff(self, attempt: int) -> float:
+        """full jitter exponential backoff"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """like `requests.request`; the last response is returned if all retries failed with a retryable status"""
+        kwargs.setdefault("timeout", self.timeout)
+        host = self.get_host_state(urlsplit(url).netloc)
+        for attempt in range(self.max_retries + 1):
+            probe = host.acquire()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                host.release(probe, success=False)
+                if attempt == self.max_retries:
+                    raise
+
+                delay = self.get_backoff(attempt)
+                print(f"{method} {url} failed ({e}); retrying in {delay:.1f}s")
+            else:
+                if not is_retryable(r):
+                    host.release(probe, success=True)
+                    return r
+
+                retry_after = get_retry_after(r)
+                if retry_after is None:
+                    delay = self.get_backoff(attempt)
+                    host.release(probe, success=False)
+                else:
+                    # all requests to this host wait (in `acquire`)
+                    delay = 0.0
+                    retry_after = min(retry_after, self.max_backoff)
+                    host.release(probe, success=False, pause=retry_after)
+
+                if attempt == self.max_retries:
+                    return r
+
+                r.close()
+                print(f"{method} {url} failed ({r.status_code}: {r.reason}); retrying in {retry_after or delay:.1f}s")
+
+            self.sleep(delay)
+
+        raise RuntimeError("unreachable")
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+
+default_client = HttpClient()
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """GET with the default client"""
+    return default_client.get(url, **kwargs)
@@ -0,0 +1,113 @@
+"""json encoding of yaml derived data (as in collection.json) in a single pass
+
+Non-finite floats are written as the strings "nan", "inf" and "-inf", datetimes (and dates) as their isoformat and
+ruamel's ScalarBoolean as a json boolean. Otherwise the output is byte-identical to
+`json.dump(data, f, allow_nan=False, indent=2, sort_keys=True)`.
+
+With orjson installed, `backend="orjson"` encodes considerably faster; its output is equivalent json, but not
+byte-identical (non-ASCII characters are not escaped and float exponents are formatted differently).
+"""
+import json
+import math
+from datetime import date
+from json.encoder import _make_iterencode, encode_basestring_ascii  # type: ignore
+from pathlib import Path
+from typing import Any, Literal
+
+from ruamel.yaml.scalarbool import ScalarBoolean
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def floatstr(o: float) -> str:
+    if o != o:
+        return '"nan"'
+    elif o == math.inf:
+        return '"inf"'
+    elif o == -math.inf:
+        return '"-inf"'
+    else:
+        return float.__repr__(o)
+
+
+def intstr(o: int) -> str:
+    if isinstance(o, ScalarBoolean):
+        return "true" if o else "false"
+    else:
+        return int.__repr__(o)
+
+
+class CollectionJSONEncoder(json.JSONEncoder):
+    def __init__(self, indent: int = 2, sort_keys: bool = True):
+        super().__init__(indent=indent, sort_keys=sort_keys, allow_nan=False)
+
+    def default(self, o):
+        if isinstance(o, date):
+            return o.isoformat()
+
+        return super().default(o)
+
+    def iterencode(self, o, _one_shot=False):
+        return _make_iterencode(
+            {},
+            self.default,
+            encode_basestring_ascii,
+            " " * self.indent,
+            floatstr,
+            self.key_separator,
+            self.item_separator,
+            self.sort_keys,
+            self.skipkeys,
+            _one_shot,
+            _intstr=intstr,
+        )(o, 0)
+
+
+def has_non_finite_float(data: Any) -> bool:
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, float):
+            if not math.isfinite(obj):
+                return True
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+
+    return False
+
+
+def orjson_default(o):
+    if isinstance(o, ScalarBoolean):
+        return bool(o)
+    elif isinstance(o, dict):
+        return dict(o)
+    elif isinstance(o, (list, tuple)):
+        return list(o)
+    elif isinstance(o, float):
+        return float(o)
+    elif isinstance(o, int):
+        return int(o)
+    elif isinstance(o, str):
+        return str(o)
+    elif isinstance(o, date):
+        return o.isoformat()
+
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dump_json(data: Any, path: Path, backend: Literal["json", "orjson"] = "json"):
+    """write `data` as json (see module docstring)"""
+    if backend == "orjson" and orjson is not None and not has_non_finite_float(data):
+        # orjson writes non-finite floats as null; data with non-finite floats is written with the json backend
+        options = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_SUBCLASS
+        path.write_bytes(orjson.dumps(data, default=orjson_default, option=options))
+        return
+
+    with path.open("w", encoding="utf-8") as f:
+        for chunk in CollectionJSONEncoder().iterencode(data):
+            f.write(chunk)
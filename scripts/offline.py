@@ -0,0 +1,260 @@
+"""record/replay of outbound http requests and a local stand-in server for zenodo.org and GitHub
+
+Record all responses of a (live) run into a cassette folder:
+    with record_responses(Path("cassette")):
+        ...
+
+Replay them offline (requests not found in the cassette are answered by a synthetic zenodo/GitHub or with 404):
+    with StandInServer(cassette=Path("cassette"), n_synthetic_records=1000) as server, redirect_to(server):
+        ...
+
+Inject transient faults (503 and 429 responses) into a fraction of all responses:
+    with StandInServer(n_synthetic_records=1000, fault_rate=0.2) as server, redirect_to(server):
+        ...
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+import requests
+
+SYNTHETIC_SHA = "0" * 40
+
+
+def get_cassette_key(method: str, url: str) -> str:
+    return hashlib.sha256(f"{method.upper()} {url}".encode("utf-8")).hexdigest()
+
+
+def save_response(cassette: Path, method: str, url: str, status: int, reason: str, headers: dict, body: bytes):
+    cassette.mkdir(parents=True, exist_ok=True)
+    key = get_cassette_key(method, url)
+    # drop headers that do not apply to the (decoded) body we store
+    headers = {k: v for k, v in headers.items() if k.lower() not in ("content-encoding", "transfer-encoding")}
+    meta = dict(method=method.upper(), url=url, status=status, reason=reason, headers=headers)
+    (cassette / f"{key}.json").write_text(json.dumps(meta, indent=2, sort_keys=True), encoding="utf-8")
+    (cassette / f"{key}.bin").write_bytes(body)
+
+
+def load_response(cassette: Path, method: str, url: str) -> Optional[Tuple[dict, bytes]]:
+    key = get_cassette_key(method, url)
+    meta_path = cassette / f"{key}.json"
+    if not meta_path.exists():
+        return None
+
+    return json.loads(meta_path.read_text(encoding="utf-8")), (cassette / f"{key}.bin").read_bytes()
+
+
+@contextmanager
+def record_responses(cassette: Path):
+    """save all responses received with `requests` to `cassette`"""
+    orig_send = requests.Session.send
+
+    def send(self, request, **kwargs):
+        r = orig_send(self, request, **kwargs)
+        body = r.content  # reads streamed responses completely; `iter_content` then iterates over the cached content
+        save_response(cassette, request.method, request.url, r.status_code, r.reason, dict(r.headers), body)
+        return r
+
+    requests.Session.send = send
+    try:
+        yield
+    finally:
+        requests.Session.send = orig_send
+
+
+@contextmanager
+def redirect_to(server: "StandInServer"):
+    """redirect all requests sent with `requests` to a local stand-in server"""
+    orig_send = requests.Session.send
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.hostname not in ("localhost", "127.0.0.1"):
+            request.url = urlunsplit(
+                ("http", server.address, f"/{parts.scheme}/{parts.netloc}{parts.path}", parts.query, "")
+            )
+
+        return orig_send(self, request, **kwargs)
+
+    requests.Session.send = send
+    try:
+        yield
+    finally:
+        requests.Session.send = orig_send
+
+
+def get_synthetic_zenodo_hit(idx: int, versions_per_resource: int = 3) -> dict:
+    """a synthetic zenodo record; records are ordered from newest (idx=0) to oldest"""
+    concept_recid = 9_000_000 + idx // versions_per_resource * (versions_per_resource + 1)
+    recid = concept_recid + 1 + idx % versions_per_resource
+    created = datetime(2024, 1, 1) - timedelta(hours=idx)
+    return {
+        "id": recid,
+        "recid": str(recid),
+        "conceptdoi": f"10.5281/zenodo.{concept_recid}",
+        "doi": f"10.5281/zenodo.{recid}",
+        "created": created.isoformat() + "+00:00",
+        "metadata": {"keywords": ["bioimage.io"], "publication_date": created.date().isoformat()},
+        "files": [{"key": "rdf.yaml", "size": 1024}],
+        "owners": [{"id": 1000 + idx % 7}],
+        "stats": {"unique_downloads": idx % 97 + 1, "version_volume": (idx % 97 + 1) * 1024},
+    }
+
+
+def get_synthetic_rdf(recid: int) -> str:
+    return (
+        "format_version: 0.2.3\n"
+        f"name: synthetic resource {recid}\n"
+        "type: application\n"
+        "description: synthetic resource for offline runs\n"
+        "authors:\n- name: bioimage.io\n"
+        "maintainers:\n- github_user: bioimageiobot\n"
+        "tags: [synthetic]\n"
+        "source: https://example.com/synthetic\n"
+    )
+
+
+def get_synthetic_partner_collection(repository: str) -> str:
+    return (
+        "format_version: 0.2.2\n"
+        "type: collection\n"
+        f"name: synthetic partner collection of {repository}\n"
+        "description: synthetic partner collection for offline runs\n"
+        "authors:\n- name: bioimage.io\n"
+        "config:\n  logo: https://example.com/logo.png\n"
+        "collection: []\n"
+    )
+
+
+class StandInServer:
+    """local http server replaying recorded responses with a synthetic zenodo.org and GitHub as fallback
+
+    Requests are expected as http://<address>/<original scheme>/<original host>/<original path>?<original query>
+    (see `redirect_to`).
+    """
+
+    def __init__(
+        self, cassette: Optional[Path] = None, n_synthetic_records: int = 0, fault_rate: float = 0.0, seed: int = 0
+    ):
+        self.cassette = cassette
+        self.n_synthetic_records = n_synthetic_records
+        self.fault_rate = fault_rate
+        self.n_faults = 0
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.address = f"127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def inject_fault(self) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        """a transient error response (for a fraction `fault_rate` of all requests)"""
+        with self._random_lock:
+            if self._random.random() >= self.fault_rate:
+                return None
+
+            self.n_faults += 1
+            if self._random.random() < 0.5:
+                return 503, {"Content-Type": "text/plain"}, b"injected fault"
+            else:
+                return 429, {"Content-Type": "text/plain", "Retry-After": "0"}, b"injected rate limit"
+
+    def respond(self, method: str, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        fault = self.inject_fault()
+        if fault is not None:
+            return fault
+
+        if self.cassette is not None:
+            recorded = load_response(self.cassette, method, url)
+            if recorded is not None:
+                meta, body = recorded
+                return meta["status"], meta["headers"], body
+
+        return self.respond_synthetic(url)
+
+    def respond_synthetic(self, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        parts = urlsplit(url)
+        path = parts.path.strip("/").split("/")
+        json_headers = {"Content-Type": "application/json"}
+        if parts.netloc == "zenodo.org" and path == ["api", "records"]:
+            query = parse_qs(parts.query)
+            page = int(query.get("page", ["1"])[0])
+            size = int(query.get("size", ["10"])[0])
+            start = (page - 1) * size
+            hits = [get_synthetic_zenodo_hit(i) for i in range(self.n_synthetic_records)]
+            concept_dois = re.findall(r'conceptdoi:"([^"]+)"', query.get("q", [""])[0])
+            if concept_dois:
+                hits = [h for h in hits if h["conceptdoi"] in concept_dois]
+
+            created_range = re.search(r'created:\["([^"]+)" TO "([^"]+)"}', query.get("q", [""])[0])
+            if created_range:
+                after, before = (datetime.fromisoformat(d) for d in created_range.groups())
+                hits = [h for h in hits if after <= datetime.fromisoformat(h["created"]).replace(tzinfo=None) < before]
+
+            body = json.dumps({"hits": {"hits": hits[start : start + size], "total": len(hits)}})
+            return 200, json_headers, body.encode("utf-8")
+        elif parts.netloc == "zenodo.org" and len(path) == 6 and path[:2] == ["api", "records"]:
+            # api/records/<recid>/files/<key>/content
+            return 200, {"Content-Type": "application/octet-stream"}, get_synthetic_rdf(int(path[2])).encode("utf-8")
+        elif parts.netloc == "api.github.com" and len(path) == 5 and path[0] == "repos" and path[3] == "commits":
+            return 200, json_headers, json.dumps({"sha": SYNTHETIC_SHA}).encode("utf-8")
+        elif parts.netloc == "github.com" and len(path) == 4 and path[2] == "archive":
+            # <owner>/<repo>/archive/<sha>.zip; an (almost) empty repository
+            repo, sha = path[1], path[3][: -len(".zip")]
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as z:
+                z.writestr(f"{repo}-{sha}/README.md", "synthetic stand-in archive\n")
+
+            return 200, {"Content-Type": "application/zip"}, buffer.getvalue()
+        elif parts.netloc == "raw.githubusercontent.com" and len(path) >= 4:
+            # <owner>/<repo>/<branch>/<partner collection file>
+            return 200, {"Content-Type": "text/plain"}, get_synthetic_partner_collection("/".join(path[:2])).encode()
+        else:
+            return 404, {"Content-Type": "text/plain"}, f"not recorded: {url}".encode("utf-8")
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self, method: str):
+                scheme, _, url = self.path.lstrip("/").partition("/")
+                url = f"{scheme}://{url}"
+                status, headers, body = server.respond(method, url)
+                self.send_response(status)
+                for k, v in headers.items():
+                    if k.lower() != "content-length":
+                        self.send_header(k, v)
+
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if method != "HEAD":
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_HEAD(self):
+                self._handle("HEAD")
+
+            def log_message(self, format, *args):
+                pass  # keep output of the replayed run readable
+
+        return Handler
@@ -0,0 +1,101 @@
+"""single-process orchestration of the collection scripts
+
+Stages exchange their return values (e.g. the pending matrix or the static validation output; gh actions job outputs in
+CI) in memory through an `ArtifactBus` instead of json strings. The stage scripts still exchange their files through
+dist as in CI. Stages without (transitive) dependencies between them run concurrently.
+"""
+import dataclasses
+import threading
+import weakref
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from profiling import install_hooks as install_profiling_hooks
+from profiling import stage as profiling_stage
+
+
+@contextmanager
+def thread_safe_yaml():
+    """serialize loads and dumps per `ruamel.yaml.YAML` instance
+
+    Stage scripts share module level `YAML` instances, which are not thread-safe.
+    """
+    from ruamel.yaml import YAML
+
+    orig_load = YAML.load
+    orig_dump = YAML.dump
+    locks: "weakref.WeakKeyDictionary[YAML, threading.RLock]" = weakref.WeakKeyDictionary()
+    locks_lock = threading.Lock()
+
+    def get_lock(yaml) -> threading.RLock:
+        with locks_lock:
+            return locks.setdefault(yaml, threading.RLock())
+
+    def load(yaml, stream):
+        with get_lock(yaml):
+            return orig_load(yaml, stream)
+
+    def dump(yaml, data, stream=None, **kwargs):
+        with get_lock(yaml):
+            return orig_dump(yaml, data, stream, **kwargs)
+
+    YAML.load = load
+    YAML.dump = dump
+    try:
+        yield
+    finally:
+        YAML.load = orig_load
+        YAML.dump = orig_dump
+
+
+class ArtifactBus:
+    """in-memory exchange of stage outputs; stage outputs are available under the stage name"""
+
+    def __init__(self):
+        self.artifacts: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        return self.artifacts[name]
+
+    def __setitem__(self, name: str, value: Any):
+        self.artifacts[name] = value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.artifacts
+
+
+@dataclasses.dataclass
+class Stage:
+    name: str
+    run: Callable[[ArtifactBus], Any]
+    needs: Sequence[str] = ()
+
+
+def run_stages(stages: Sequence[Stage], bus: Optional[ArtifactBus] = None, max_workers: int = 4) -> ArtifactBus:
+    """run stages as soon as the stages they need are done (concurrently if possible)"""
+    bus = bus or ArtifactBus()
+    pending = list(stages)
+    running: Dict[Future, Stage] = {}
+
+    def run_stage(s: Stage):
+        with profiling_stage(s.name):
+            return s.run(bus)
+
+    install_profiling_hooks()
+    with thread_safe_yaml(), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            ready = [s for s in pending if all(n in bus for n in s.needs)]
+            for s in ready:
+                pending.remove(s)
+                running[executor.submit(run_stage, s)] = s
+
+            if not running:
+                raise ValueError(f"Stages with unknown needs: {[(s.name, s.needs) for s in pending]}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                s = running.pop(future)
+                bus[s.name] = future.result()  # raises stage exceptions
+
+    return bus
@@ -0,0 +1,234 @@
+"""prefetch remote files of pending resource versions ahead of static and dynamic validation
+
+Remote files (weights, test and sample tensors, covers, documentation, attachments and dependency files) of all pending
+RDFs are downloaded in parallel with bioimageio.spec's own download API into its download cache, so
+`bioimageio.spec`/`bioimageio.core` read local copies instead of downloading each file again. Paths relative to the
+original rdf source are resolved against it. Downloaded files are hardlinked into a content-addressed store, whose index
+provides the sha256 of unchanged files without hashing them again. Declared sha256 values are verified.
+(bioimageio.spec performs the download and exposes no byte stream, so files are hashed once from disk after download.)
+A manifest lists the outcome for every URI; dynamic validation jobs use it for the sha256 of undeclared weights.
+In CI, each dynamic validation job caches only the remote files of its own test case (see validate_resources.yaml).
+
+    python scripts/prefetch.py '<pending matrix>'
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import StringIO
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import typer
+from bare_utils import PREFETCH_MANIFEST_FILE_NAME
+from bioimageio.spec.shared import resolve_source
+from bioimageio.spec.shared.common import CacheWarning
+from bioimageio.spec.shared.raw_nodes import URI
+from deploy import link_or_copy
+from download_documentation import is_immutable
+from tqdm import tqdm
+from utils import iterate_over_gh_matrix, yaml
+
+PREFETCH_STORE = Path(__file__).parent / "../.cache/prefetch"
+
+TENSOR_FIELDS = ("test_inputs", "test_outputs", "sample_inputs", "sample_outputs")
+
+
+def iterate_remote_files(rdf: Dict[str, Any], root: Optional[str] = None) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """(source, uri, declared sha256) of all remote files an rdf refers to
+
+    Relative sources are resolved against `root`, the remote rdf source (skipped without it).
+    """
+    candidates = [(rdf.get("documentation"), None), (rdf.get("icon"), None)]
+    candidates += [(source, None) for source in rdf.get("covers") or []]
+    for field in TENSOR_FIELDS:
+        candidates += [(source, None) for source in rdf.get(field) or []]
+
+    attachments = rdf.get("attachments")
+    if isinstance(attachments, dict):
+        candidates += [(source, None) for source in attachments.get("files") or []]
+
+    weights = rdf.get("weights")
+    if isinstance(weights, dict):
+        for entry in weights.values():
+            if not isinstance(entry, dict):
+                continue
+
+            candidates.append((entry.get("source"), entry.get("sha256")))
+            dependencies = entry.get("dependencies")
+            if isinstance(dependencies, str):
+                candidates.append((dependencies.partition(":")[2], None))  # <manager>:<source>
+
+    root_uri = None if root is None else URI(uri_string=root).parent
+    for source, sha256 in candidates:
+        if not isinstance(source, str) or not source:
+            continue
+
+        if source.startswith("https://"):  # the only remote scheme bioimageio.spec resolves
+            uri = source
+        elif root_uri is not None and not urlsplit(source).scheme and not source.startswith("/"):
+            uri = str(root_uri / source)  # path relative to the rdf source
+        else:
+            continue
+
+        yield source, uri, sha256 if isinstance(sha256, str) else None
+
+
+def get_rdf_source(collection: Path, resource_id: str, version_id: str) -> Optional[str]:
+    """remote rdf source of a resource version as listed in the collection"""
+    resource_path = collection / resource_id / "resource.yaml"
+    if not resource_path.exists():
+        return None
+
+    resource = yaml.load(resource_path)
+    for version in resource.get("versions") or []:
+        if version.get("version_id") == version_id:
+            rdf_source = version.get("rdf_source")
+            if isinstance(rdf_source, str) and rdf_source.startswith("https://"):
+                return rdf_source
+
+    return None
+
+
+def download(uri: str) -> Path:
+    """local copy of `uri` in the bioimageio.spec download cache (downloaded by bioimageio.spec if missing)"""
+    return resolve_source(URI(uri_string=uri), pbar=partial(tqdm, file=StringIO()))  # no interleaved progress bars
+
+
+class PrefetchStore:
+    """content-addressed store of hardlinks to prefetched files with an index keyed by URI"""
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self.index_path = folder / "index.json"
+        if self.index_path.exists():
+            self.index: Dict[str, str] = json.loads(self.index_path.read_text(encoding="utf-8"))
+        else:
+            self.index = {}
+
+        self._lock = threading.Lock()
+
+    def get_blob_path(self, sha256: str) -> Path:
+        return self.folder / "blobs" / sha256
+
+    def get(self, uri: str, local_path: Path) -> Optional[str]:
+        """sha256 of `local_path` if it is the stored content of `uri`"""
+        with self._lock:
+            sha256 = self.index.get(uri)
+
+        if sha256 is None:
+            return None
+
+        blob_path = self.get_blob_path(sha256)
+        if not blob_path.exists() or not os.path.samefile(blob_path, local_path):
+            return None
+
+        return sha256
+
+    def add(self, uri: str, local_path: Path) -> str:
+        """store the content of `uri` at `local_path`; returns its sha256"""
+        h = hashlib.sha256()
+        with local_path.open("rb") as f:
+            for chunk in iter(partial(f.read, 2**20), b""):
+                h.update(chunk)
+
+        sha256 = h.hexdigest()
+        link_or_copy(local_path, self.get_blob_path(sha256))
+        with self._lock:
+            self.index[uri] = sha256
+
+        return sha256
+
+    def save(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self.index_path.write_text(json.dumps(self.index, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def prefetch(store: PrefetchStore, uri: str, declared_sha256: Optional[str]) -> Dict[str, Any]:
+    """manifest entry of a prefetched uri"""
+    started = time.time()
+    cached = False
+    try:
+        local_path = download(uri)
+        cached = local_path.stat().st_mtime < started
+        if cached and declared_sha256 is None and not is_immutable(uri):
+            # the content of a mutable uri might have changed since it was cached
+            local_path.unlink()
+            local_path = download(uri)
+            cached = False
+
+        sha256 = (cached and store.get(uri, local_path)) or store.add(uri, local_path)
+        if declared_sha256 is not None and sha256 != declared_sha256:
+            local_path.unlink()  # do not leave unexpected content in the bioimageio.spec cache
+            return dict(
+                cached=cached, status="failed", error=f"sha256 mismatch: expected {declared_sha256}, got {sha256}"
+            )
+    except Exception as e:
+        return dict(cached=cached, status="failed", error=str(e))
+
+    return dict(cached=cached, status="passed", sha256=sha256, size=local_path.stat().st_size)
+
+
+def main(
+    pending_matrix: str,
+    rdf_dirs: List[Path] = (
+        Path(__file__).parent / "../dist/updated_rdfs/rdfs",
+        Path(__file__).parent / "../gh-pages/rdfs",
+    ),
+    collection: Path = Path(__file__).parent / "../collection",
+    store: Path = PREFETCH_STORE,
+    manifest: Path = Path(__file__).parent / f"../dist/static_validation_artifact/{PREFETCH_MANIFEST_FILE_NAME}",
+    max_workers: int = 8,
+):
+    """prefetch remote files of pending resource versions"""
+    uris: Dict[str, Optional[str]] = {}  # uri -> declared sha256
+    versions: Dict[str, Dict[str, str]] = {}  # <resource_id>/<version_id> -> source -> uri
+    for matrix in iterate_over_gh_matrix(pending_matrix):
+        resource_id = matrix["resource_id"]
+        version_id = matrix["version_id"]
+        for root in rdf_dirs:
+            rdf_path = root / resource_id / version_id / "rdf.yaml"
+            if rdf_path.exists():
+                break
+        else:
+            print(f"skipping {resource_id}/{version_id} (rdf.yaml not found in {rdf_dirs})")
+            continue
+
+        rdf = yaml.load(rdf_path)
+        if not isinstance(rdf, dict):
+            continue
+
+        version_uris = versions.setdefault(f"{resource_id}/{version_id}", {})
+        for source, uri, sha256 in iterate_remote_files(rdf, get_rdf_source(collection, resource_id, version_id)):
+            version_uris[source] = uri
+            if uris.get(uri) is None:
+                uris[uri] = sha256
+
+    warnings.filterwarnings("ignore", category=CacheWarning)
+    prefetch_store = PrefetchStore(store)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {uri: executor.submit(prefetch, prefetch_store, uri, sha256) for uri, sha256 in uris.items()}
+        files = {uri: f.result() for uri, f in futures.items()}
+
+    prefetch_store.save()
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    manifest.write_text(json.dumps(dict(files=files, versions=versions), indent=2, sort_keys=True), encoding="utf-8")
+
+    failed = [uri for uri, entry in files.items() if entry["status"] != "passed"]
+    n_cached = sum(entry["cached"] for entry in files.values())
+    print(
+        f"prefetched {len(files) - len(failed)} of {len(files)} remote files ({n_cached} already in the bioimageio.spec cache) "
+        f"for {len(versions)} resource versions"
+    )
+    for uri in failed:
+        print(f"failed to prefetch {uri}: {files[uri]['error']}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
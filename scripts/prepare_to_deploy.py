@@ -1,12 +1,18 @@
-import copy
+import hashlib
+import json
 import shutil
 from pathlib import Path
 from typing import Any, Dict, List
 
 import typer
+from bare_utils import get_sha256
 from bioimageio.spec.shared import yaml
+from deploy import is_unchanged, link_or_copy
 from packaging.version import Version
-from utils import iterate_known_resource_versions
+from profiling import items
+from summary_store import SUMMARY_STORE_FILE_NAME, SummaryStore
+from utils import WriteCounts, dump_yaml_if_changed, iterate_known_resource_versions
+from validation_cache import CACHE_ENTRY_FILE_NAME
 
 
 def get_sub_summaries(path: Path):
@@ -17,33 +23,43 @@ def get_sub_summaries(path: Path):
     return [{k: v for k, v in sub.items() if k != "source_name"} for sub in subs]
 
 
+# fields identifying a test summary entry (for deduplication)
+SUMMARY_KEY_FIELDS = (
+    "bioimageio_spec_version",
+    "bioimageio_core_version",
+    "name",
+    "status",
+    "error",
+    "warnings",
+    "nested_errors",
+)
+
+
+def get_summary_digest(summary: Dict[str, Any]) -> str:
+    """blake2b digest of the canonical serialization of the fields identifying a test summary entry"""
+    canonical = json.dumps(
+        [summary.get(k) for k in SUMMARY_KEY_FIELDS], sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
 def filter_test_summaries(tests: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """remove duplicate test summary entries (keeping the first one, 'bioimageio' entries first)
+
+    The digest of each entry is (re)computed and stored in the entry as 'digest';
+    a digest already present (e.g. in a partner supplied summary) is not trusted.
+    """
     unique_tests = set()
     ret = {}
     for partner in ["bioimageio"] + [p for p in tests if p != "bioimageio"]:  # process 'bioimageio' first
         for summary in tests.get(partner, []):
-            key = tuple(
-                [
-                    str(summary.get(k))
-                    for k in (
-                        "bioimageio_spec_version",
-                        "bioimageio_core_version",
-                        "name",
-                        "status",
-                        "error",
-                        "warnings",
-                        "nested_errors",
-                    )
-                ]
-            )
-            if key in unique_tests:
-                continue
+            summary["digest"] = get_summary_digest(summary)
 
-            unique_tests.add(key)
-            if partner not in ret:
-                ret[partner] = []
+            if summary["digest"] in unique_tests:
+                continue
 
-            ret[partner].append(summary)
+            unique_tests.add(summary["digest"])
+            ret.setdefault(partner, []).append(summary)
 
     return ret
 
@@ -70,25 +86,36 @@ def main(
     static_validation_artifact_dir = artifact_dir / "static_validation_artifact"
     for updated_rdf_path in static_validation_artifact_dir.glob(f"{resource_id_pattern}/*/rdf.yaml"):
         updated_rdf_gh_pages_path = gh_pages / "rdfs" / updated_rdf_path.relative_to(static_validation_artifact_dir)
-        updated_rdf_gh_pages_path.parent.mkdir(exist_ok=True, parents=True)
+        if is_unchanged(updated_rdf_path, updated_rdf_gh_pages_path):
+            print(f"unchanged: {updated_rdf_gh_pages_path}")
+            continue
+
         print(f"copy to deploy: {updated_rdf_path} -> {updated_rdf_gh_pages_path}")
-        shutil.copy(str(updated_rdf_path), str(updated_rdf_gh_pages_path))
+        link_or_copy(updated_rdf_path, updated_rdf_gh_pages_path)
 
         updated_rdf_deploy_path = dist / "rdfs" / updated_rdf_path.relative_to(static_validation_artifact_dir)
         updated_rdf_deploy_path.parent.mkdir(exist_ok=True, parents=True)
         shutil.move(str(updated_rdf_path), str(updated_rdf_deploy_path))
 
-    for krv in iterate_known_resource_versions(
-        collection=collection, gh_pages=gh_pages, resource_id=resource_id_pattern, status="accepted"
+    # update the test summary store (copied from gh-pages to be deployed)
+    if (gh_pages / SUMMARY_STORE_FILE_NAME).exists():
+        shutil.copy(str(gh_pages / SUMMARY_STORE_FILE_NAME), str(dist / SUMMARY_STORE_FILE_NAME))
+
+    summary_store = SummaryStore(dist / SUMMARY_STORE_FILE_NAME)
+    counts = WriteCounts()
+    for krv in items(
+        iterate_known_resource_versions(
+            collection=collection, gh_pages=gh_pages, resource_id=resource_id_pattern, status="accepted"
+        ),
+        lambda krv: f"{krv.resource_id}/{krv.version_id}",
     ):
         print(f"updating test summary for {krv.resource_id}/{krv.version_id}")
         previous_test_summary_path = gh_pages / "rdfs" / krv.resource_id / krv.version_id / "test_summary.yaml"
         if previous_test_summary_path.exists():
-            previous_test_summary = yaml.load(previous_test_summary_path) or {}
+            test_summary = yaml.load(previous_test_summary_path) or {}
         else:
-            previous_test_summary = {}
+            test_summary = {}
 
-        test_summary = copy.deepcopy(previous_test_summary)
         test_summary["rdf_sha256"] = krv.rdf_sha256
         if "tests" not in test_summary:
             test_summary["tests"] = {}
@@ -127,6 +154,11 @@ def main(
                 )
 
             print("dyn sums:\n", dyn_sums)
+            # add passed dynamic validation results to the cache
+            for cache_entry_path in sorted({sp.with_name(CACHE_ENTRY_FILE_NAME) for sp in dyn_sums}):
+                if cache_entry_path.exists():
+                    summary_store.add_cached_result(json.loads(cache_entry_path.read_text(encoding="utf-8")))
+
             # append dynamic validation summaries from artifact
             core_versions = set()
             for sp in dyn_sums:
@@ -163,11 +195,19 @@ def main(
         test_summary["tests"] = filter_test_summaries(test_summary["tests"])
 
         # write updated test summary
-        if test_summary != previous_test_summary:
-            updated_test_summary_path = dist / previous_test_summary_path.relative_to(gh_pages)
-            assert not updated_test_summary_path.exists()
-            updated_test_summary_path.parent.mkdir(exist_ok=True, parents=True)
-            yaml.dump(test_summary, updated_test_summary_path)
+        updated_test_summary_path = dist / previous_test_summary_path.relative_to(gh_pages)
+        assert not updated_test_summary_path.exists()
+        if dump_yaml_if_changed(
+            test_summary, updated_test_summary_path, compare_to=previous_test_summary_path, dumper=yaml, counts=counts
+        ):
+            deployed_test_summary_path = updated_test_summary_path
+        else:
+            deployed_test_summary_path = previous_test_summary_path
+
+        summary_store.upsert(krv.resource_id, krv.version_id, test_summary, get_sha256(deployed_test_summary_path))
+
+    summary_store.close()
+    print(f"test_summary.yaml: {counts}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,219 @@
+"""run-wide timing instrumentation for the collection scripts
+
+Usage:
+    with stage("update_rdfs"):
+        ...
+        with item(f"{resource_id}/{version_id}"):
+            ...
+
+    write_timings(Path("timings.json"))
+
+Set the environment variable BIOIMAGEIO_PROFILE to a folder to additionally write a cProfile dump
+(<stage>.prof) for every stage to that folder, e.g. for inspection with snakeviz.
+For sampling profiles of a complete run 'py-spy record -- python scripts/run_main_ci_equivalent_local.py' may be used.
+
+Note: http requests and yaml loads/dumps are counted for all currently recording stages,
+i.e. stages running concurrently (in different threads) share these counts.
+The recorded peak rss is that of the whole process up to the end of a stage (or item), not of the stage alone;
+run each stage in a separate process to measure its own peak memory (as `benchmark.py` does).
+"""
+import cProfile
+import dataclasses
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Generator, Iterable, List, Optional, TypeVar
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+PROFILE_DIR = os.getenv("BIOIMAGEIO_PROFILE")
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass
+class TimingRecord:
+    name: str
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    http_requests: int = 0
+    http_bytes: int = 0
+    yaml_loads: int = 0
+    yaml_load_time: float = 0.0
+    yaml_dumps: int = 0
+    yaml_dump_time: float = 0.0
+    peak_rss_kb: Optional[int] = None  # peak rss of the process so far (not of this record alone)
+    items: Dict[str, "TimingRecord"] = dataclasses.field(default_factory=dict)
+
+
+STAGES: List[TimingRecord] = []
+_active: List[TimingRecord] = []  # currently recording stage and item records (of all threads)
+_local = threading.local()  # current stage per thread
+_hooks_installed = False
+
+
+def get_peak_rss_kb() -> Optional[int]:
+    """peak resident set size of this process since it started"""
+    if resource is None:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _count(**increments):
+    for record in _active:
+        for k, v in increments.items():
+            setattr(record, k, getattr(record, k) + v)
+
+
+def install_hooks():
+    """count http requests (sent with `requests`) and yaml loads/dumps (done with `ruamel.yaml`)"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+
+    import requests
+    from ruamel.yaml import YAML
+
+    orig_send = requests.Session.send
+
+    def send(self, request, **kwargs):
+        r = orig_send(self, request, **kwargs)
+        if kwargs.get("stream"):
+            n_bytes = int(r.headers.get("content-length", 0))
+        else:
+            n_bytes = len(r.content)
+
+        _count(http_requests=1, http_bytes=n_bytes)
+        return r
+
+    orig_load = YAML.load
+    orig_dump = YAML.dump
+
+    def load(self, stream):
+        if getattr(self, "_profiling_loading", False):  # YAML.load(path) calls YAML.load(file object)
+            return orig_load(self, stream)
+
+        start = time.perf_counter()
+        self._profiling_loading = True
+        try:
+            return orig_load(self, stream)
+        finally:
+            self._profiling_loading = False
+            _count(yaml_loads=1, yaml_load_time=time.perf_counter() - start)
+
+    def dump(self, data, stream=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return orig_dump(self, data, stream, **kwargs)
+        finally:
+            _count(yaml_dumps=1, yaml_dump_time=time.perf_counter() - start)
+
+    requests.Session.send = send
+    YAML.load = load
+    YAML.dump = dump
+    _hooks_installed = True
+
+
+@contextmanager
+def _record(record: TimingRecord):
+    _active.append(record)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record.wall_time += time.perf_counter() - wall_start
+        record.cpu_time += time.process_time() - cpu_start
+        record.peak_rss_kb = get_peak_rss_kb()
+        _active.remove(record)
+
+
+@contextmanager
+def stage(name: str):
+    """record timings of a pipeline stage (e.g. a script's main function)"""
+    install_hooks()
+    record = TimingRecord(name)
+    STAGES.append(record)
+    outer_stage = getattr(_local, "stage", None)
+    _local.stage = record
+    profiler = None
+    if PROFILE_DIR:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        with _record(record):
+            yield record
+    finally:
+        _local.stage = outer_stage
+        if profiler is not None:
+            profiler.disable()
+            Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(Path(PROFILE_DIR) / f"{name}.prof"))
+
+
+@contextmanager
+def item(name: str):
+    """record timings of a resource/version within the current stage (no-op outside of a stage)"""
+    current_stage = getattr(_local, "stage", None)
+    if current_stage is None:
+        yield None
+        return
+
+    record = current_stage.items.setdefault(name, TimingRecord(name))
+    with _record(record):
+        yield record
+
+
+def items(iterable: Iterable[T], get_name: Callable[[T], str]) -> Generator[T, None, None]:
+    """record timings of the loop body per item, e.g. `for r in items(resources, lambda r: r.resource_id): ...`"""
+    for x in iterable:
+        with item(get_name(x)):
+            yield x
+
+
+def write_timings(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump([dataclasses.asdict(s) for s in STAGES], f, indent=2)
+
+
+def format_summary() -> str:
+    header = (
+        "stage",
+        "wall [s]",
+        "cpu [s]",
+        "http",
+        "http [MB]",
+        "yaml load",
+        "load [s]",
+        "yaml dump",
+        "dump [s]",
+        "peak rss so far [MB]",
+    )
+    rows = [
+        (
+            s.name,
+            f"{s.wall_time:.2f}",
+            f"{s.cpu_time:.2f}",
+            str(s.http_requests),
+            f"{s.http_bytes / 1e6:.2f}",
+            str(s.yaml_loads),
+            f"{s.yaml_load_time:.2f}",
+            str(s.yaml_dumps),
+            f"{s.yaml_dump_time:.2f}",
+            "?" if s.peak_rss_kb is None else f"{s.peak_rss_kb / 1024:.0f}",
+        )
+        for s in STAGES
+    ]
+    widths = [max(len(r[i]) for r in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() for r in [header] + rows]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
@@ -0,0 +1,87 @@
+"""refresh download counts of known zenodo resources (without harvesting metadata or rdfs)
+
+Records of known concept DOIs are queried in batches; resource.yaml files are not touched.
+"""
+import json
+from pathlib import Path
+from pprint import pprint
+from typing import List
+
+import numpy
+import typer
+from download_stats import (
+    DOWNLOAD_STATS_FILE_NAME,
+    RESOURCE_TYPES,
+    DownloadStatsBuilder,
+    aggregate_per_type,
+    get_download_counts,
+    get_record_id,
+    load_stats,
+    save_stats,
+)
+from zenodo import get_concept_doi_query, iterate_record_pages
+
+
+def get_known_concept_dois(collection: Path, gh_pages: Path) -> List[str]:
+    """concept DOIs of zenodo resources in the collection and with previous download counts"""
+    concept_dois = {p.parent.relative_to(collection).as_posix() for p in collection.glob("10.5281/*/resource.yaml")}
+    download_counts_path = gh_pages / "download_counts.json"
+    if download_counts_path.exists():
+        concept_dois.update(json.loads(download_counts_path.read_text(encoding="utf-8")))
+
+    return sorted(concept_dois)
+
+
+def main(
+    collection: Path = Path(__file__).parent / "../collection",
+    gh_pages: Path = Path(__file__).parent / "../gh-pages",
+    dist: Path = Path(__file__).parent / "../dist",
+    download_counts_offsets: Path = Path(__file__).parent / "../download_counts_offsets.json",
+    batch_size: int = 50,
+):
+    """write refreshed download_counts.json and download statistics to dist"""
+    concept_dois = get_known_concept_dois(collection, gh_pages)
+    print(f"refreshing download counts of {len(concept_dois)} resources")
+    download_stats = DownloadStatsBuilder()
+    # resource types are only known from previous (full) harvests
+    latest_stats = load_stats(gh_pages / DOWNLOAD_STATS_FILE_NAME)
+    types = dict(zip(latest_stats["concept_recid"].tolist(), latest_stats["type"].tolist()))
+    for start in range(0, len(concept_dois), batch_size):
+        query = get_concept_doi_query(concept_dois[start : start + batch_size])
+        for hits in iterate_record_pages(query, size=batch_size * 20):
+            for hit in hits:
+                type_code = types.get(get_record_id(hit["conceptdoi"]), 0)
+                download_stats.append_hit(hit, RESOURCE_TYPES[type_code])
+
+    stats = download_stats.to_table()
+    if not len(stats):
+        print("no records found")
+        raise typer.Exit(code=1)
+
+    offsets = json.loads(download_counts_offsets.read_text(encoding="utf-8"))
+    download_counts = get_download_counts(stats, offsets)
+    missing = sorted(set(concept_dois) - set(download_counts))
+    if missing:
+        print(f"keeping previous download counts of {len(missing)} resources without records")
+        previous_download_counts_path = gh_pages / "download_counts.json"
+        if previous_download_counts_path.exists():
+            previous_download_counts = json.loads(previous_download_counts_path.read_text(encoding="utf-8"))
+            download_counts.update(
+                {doi: previous_download_counts[doi] for doi in missing if doi in previous_download_counts}
+            )
+
+    print("download counts per resource type:")
+    pprint(aggregate_per_type(download_counts, stats))
+
+    dist.mkdir(parents=True, exist_ok=True)
+    with (dist / "download_counts.json").open("w", encoding="utf-8") as f:
+        json.dump(download_counts, f, indent=2, sort_keys=True)
+
+    # today's snapshot: refreshed records and today's previous records of other resources
+    todays_stats = load_stats(gh_pages / DOWNLOAD_STATS_FILE_NAME, day=str(stats["harvested"][0]))
+    keep = ~numpy.isin(todays_stats["concept_recid"], stats["concept_recid"])
+    save_stats(numpy.concatenate([stats, todays_stats[keep]]), dist / DOWNLOAD_STATS_FILE_NAME)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,7 +1,71 @@
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import List, Optional, Set, Tuple
 
+import typer
 from bioimageio.spec.shared import yaml
-from utils import iterate_known_resource_versions
+from bare_utils import get_sha256
+from summary_store import (
+    SUMMARY_STORE_FILE_NAME,
+    SummaryStore,
+    VersionKey,
+    get_up_to_date_versions,
+    open_deployed_store,
+)
+from utils import iterate_known_resources
+
+
+def get_accepted_versions(collection: Path, gh_pages: Path) -> Set[VersionKey]:
+    """accepted versions of accepted (and partner) resources"""
+    accepted = set()
+    for r in iterate_known_resources(collection=collection, gh_pages=gh_pages, status="accepted"):
+        for v_info in r.info.get("versions", []):
+            if v_info["status"] == "accepted":
+                accepted.add((r.resource_id, v_info["version_id"]))
+
+    return accepted
+
+
+def get_candidates(collection: Path, gh_pages: Path, partner_id: str) -> List[Path]:
+    """test summaries of accepted versions that (might) contain test results of the partner"""
+    accepted = get_accepted_versions(collection, gh_pages)
+    store = open_deployed_store(gh_pages)
+    if store is not None:
+        with store:
+            tested = store.get_versions_tested_by(partner_id)
+            stored = get_up_to_date_versions(store, gh_pages)
+
+        candidates = [
+            gh_pages / "rdfs" / r_id / v_id / "test_summary.yaml" for r_id, v_id in sorted(tested & stored & accepted)
+        ]
+    else:
+        stored = set()
+        candidates = []
+
+    # test summaries not (up to date) in the store are checked textually for the partner key
+    for test_summary_path in (gh_pages / "rdfs").glob("**/test_summary.yaml"):
+        version_folder = test_summary_path.parent
+        key = (version_folder.parent.relative_to(gh_pages / "rdfs").as_posix(), version_folder.name)
+        if key in accepted and key not in stored and f"{partner_id}:" in test_summary_path.read_text(encoding="utf-8"):
+            candidates.append(test_summary_path)
+
+    return candidates
+
+
+def reset(test_summary_path: Path, partner_id: str, output_path: Path) -> Optional[Tuple[Path, dict]]:
+    """write test summary without the partner's test results to output_path (if it had any)"""
+    if not test_summary_path.exists():
+        return None
+
+    test_summary = yaml.load(test_summary_path)
+    if not isinstance(test_summary, dict) or partner_id not in test_summary.get("tests", {}):
+        return None
+
+    test_summary["tests"] = {k: v for k, v in test_summary["tests"].items() if k != partner_id}
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    yaml.dump(test_summary, output_path)
+    return output_path, test_summary
 
 
 def main(
@@ -9,14 +73,34 @@ def main(
     dist: Path = Path(__file__).parent / "../dist",
     collection: Path = Path(__file__).parent / "../collection",
     gh_pages: Path = Path(__file__).parent / "../gh-pages",
+    max_workers: Optional[int] = None,
 ):
     """reset partner test summaries"""
     dist.mkdir(parents=True, exist_ok=True)
-    for v in iterate_known_resource_versions(collection=collection, gh_pages=gh_pages, status="accepted"):
-        test_summary_path = v.rdf_path.with_name("test_summary.yaml")
-        if test_summary_path.exists():
-            test_summary = yaml.load(test_summary_path)
-            if "tests" in test_summary:
-                test_summary["tests"] = {k: v for k, v in test_summary["tests"].items() if k != partner_id}
-                test_summary_path = dist / test_summary_path.relative_to(gh_pages)
-                yaml.dump(test_summary, test_summary_path)
+    candidates = get_candidates(collection, gh_pages, partner_id)
+    outputs = [dist / p.relative_to(gh_pages) for p in candidates]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = [
+            r
+            for r in executor.map(reset, candidates, [partner_id] * len(candidates), outputs, chunksize=32)
+            if r is not None
+        ]
+
+    print(f"reset {partner_id} test summaries in {len(results)} of {len(candidates)} candidates")
+
+    # update test summary store
+    if results and (gh_pages / SUMMARY_STORE_FILE_NAME).exists():
+        shutil.copy(str(gh_pages / SUMMARY_STORE_FILE_NAME), str(dist / SUMMARY_STORE_FILE_NAME))
+        with SummaryStore(dist / SUMMARY_STORE_FILE_NAME) as store:
+            for output_path, test_summary in results:
+                version_folder = output_path.parent
+                store.upsert(
+                    version_folder.parent.relative_to(dist / "rdfs").as_posix(),
+                    version_folder.name,
+                    test_summary,
+                    get_sha256(output_path),
+                )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,34 +1,41 @@
 """script to run a rough equivalent of the github actions workflow 'collection_main.yaml' locally"""
 import io
-import json
 import shutil
 import tempfile
 import zipfile
+from contextlib import ExitStack
 from pathlib import Path
 from pprint import pprint
+from typing import Optional
 
-import requests
 import typer
 from bare_utils import GH_API_URL, GITHUB_REPOSITORY_OWNER
+from deploy import deploy
+from download_stats import DOWNLOAD_STATS_FILE_NAME
 from dynamic_validation import main as dynamic_validation_script
+from generate_collection_rdf_and_thumbnails import main as generate_collection_rdf_and_thumbnails_script
+from http_client import http_get
+from offline import StandInServer, record_responses, redirect_to
+from pipeline import ArtifactBus, Stage, run_stages
+from prefetch import main as prefetch_script
 from prepare_to_deploy import main as prepare_to_deploy_script
+from profiling import format_summary, items, write_timings
 from static_validation import main as static_validation_script
+from update_external_resources import HARVEST_CURSOR_FILE_NAME
 from update_external_resources import main as update_external_resources_script
 from update_partner_resources import main as update_partner_resources_script
 from update_rdfs import main as update_rdfs_script
 from utils import iterate_over_gh_matrix
 
-from scripts.generate_collection_rdf_and_thumbnails import main as generate_collection_rdf_and_thumbnails_script
-
 
 def download_from_gh(owner: str, repo: str, branch: str, folder: Path):
-    r = requests.get(
+    r = http_get(
         f"{ GH_API_URL }/repos/{ owner }/{ repo }/commits/{ branch }",
         headers=dict(Accept="application/vnd.github.v3+json"),
     )
     r.raise_for_status()
     sha = r.json()["sha"]
-    r = requests.get(f"https://github.com/{owner}/{repo}/archive/{sha}.zip")
+    r = http_get(f"https://github.com/{owner}/{repo}/archive/{sha}.zip")
     r.raise_for_status()
     z = zipfile.ZipFile(io.BytesIO(r.content))
     with tempfile.TemporaryDirectory() as temp:
@@ -37,8 +44,8 @@ def download_from_gh(owner: str, repo: str, branch: str, folder: Path):
 
 
 def fake_deploy(dist: Path, deploy_to: Path):
-    if dist.exists():
-        shutil.copytree(str(dist), str(deploy_to), dirs_exist_ok=True)
+    manifest = deploy(dist, deploy_to)
+    print(f"deployed {dist} to {deploy_to}: {manifest}")
 
 
 def end_of_job(dist: Path, always_continue: bool):
@@ -49,7 +56,15 @@ def end_of_job(dist: Path, always_continue: bool):
         shutil.rmtree(str(dist))
 
 
-def main(always_continue: bool = True, skip_update_external: bool = True, with_state: bool = True):
+def main(
+    always_continue: bool = True,
+    skip_update_external: bool = True,
+    with_state: bool = True,
+    record: Optional[Path] = None,
+    replay: Optional[Path] = None,
+    synthetic_records: int = 0,
+    fault_rate: float = 0.0,
+):
     """run a close equivalent to the 'update collection' (auto_update_main.yaml) workflow.
     # todo: improve this script and substitute the GitHub Actions CI with it in order to make deployment more transparent
 
@@ -57,8 +72,33 @@ def main(always_continue: bool = True, skip_update_external: bool = True, with_s
         always_continue: Set to False for debugging to pause between individual deployment steps
         skip_update_external: Don't query zenodo.org for new relevant records
         with_state: checkout current 'gh-pages' branch and 'lst_ci_run" tag to evaluate difference only
+        record: folder to record all http responses to (for a later offline replay)
+        replay: folder with recorded http responses to replay offline (instead of querying zenodo.org, GitHub, etc.)
+        synthetic_records: (offline only) number of synthetic zenodo records to serve for requests not found in `replay`
+        fault_rate: (offline only) fraction of requests answered with a transient error (503 or 429)
 
     """
+    offline = replay is not None or bool(synthetic_records)
+    if fault_rate and not offline:
+        raise typer.BadParameter("faults are only injected offline (with --replay or --synthetic-records)")
+
+    with ExitStack() as stack:
+        if offline:
+            server = stack.enter_context(
+                StandInServer(cassette=replay, n_synthetic_records=synthetic_records, fault_rate=fault_rate)
+            )
+            stack.enter_context(redirect_to(server))
+            print(f"running offline with stand-in server at {server.address}")
+
+        if record is not None:
+            stack.enter_context(record_responses(record))
+
+        run(always_continue=always_continue, skip_update_external=skip_update_external, with_state=with_state)
+        if fault_rate:
+            print(f"stand-in server injected {server.n_faults} faults")
+
+
+def run(always_continue: bool, skip_update_external: bool, with_state: bool):
     # local setup
     collection = Path(__file__).parent / "../collection"
 
@@ -97,82 +137,126 @@ def main(always_continue: bool = True, skip_update_external: bool = True, with_s
     ###################################
     # update resources (resource infos)
     ###################################
-    if not skip_update_external:
-        updates = update_external_resources_script()
+    def update_external_resources(bus: ArtifactBus):
+        # write to a separate dist folder to run concurrently to 'update_partner_resources'
+        external_dist = dist.parent / "dist_external"
+        # pending auto-update branches are local branches of this repository
+        updates = update_external_resources_script(
+            dist=external_dist, gh_pages=gh_pages, remote=str(Path(__file__).parent / "..")
+        )
         print("would open auto-update PRs with:")
         pprint(updates)
 
         # super fake deploy
-        shutil.move((dist / "download_counts.json").as_posix(), "tmp_download_counts.json")
+        dist.mkdir(parents=True, exist_ok=True)
+        for file_name in ("download_counts.json", DOWNLOAD_STATS_FILE_NAME, HARVEST_CURSOR_FILE_NAME):
+            if (external_dist / file_name).exists():
+                shutil.move((external_dist / file_name).as_posix(), (dist / file_name).as_posix())
 
-        fake_deploy(dist, collection)  # in CI done via PRs
+        fake_deploy(external_dist, collection)  # in CI done via PRs
+        if external_dist.exists():
+            shutil.rmtree(str(external_dist))
 
-    if dist.exists():
-        shutil.rmtree(str(dist))
-        tmp_dwn_counts = Path("tmp_download_counts.json")
-        if tmp_dwn_counts.exists():
-            dist.mkdir(parents=True)
-            shutil.move(tmp_dwn_counts.as_posix(), (dist / "download_counts.json").as_posix())
+        return updates
 
-    update_partner_resources_script()
-    fake_deploy(dist, gh_pages)
+    def deploy_resources(bus: ArtifactBus):
+        fake_deploy(dist, gh_pages)
+        end_of_job(dist, always_continue)
 
-    end_of_job(dist, always_continue)
     #####################################################
     # update rdfs (resource versions) + static-validation
     #####################################################
-    pending = update_rdfs_script()
-
-    print("\npending (updated):")
-    pprint(pending)
+    def update_rdfs(bus: ArtifactBus):
+        pending = update_rdfs_script()
+        print("\npending (updated):")
+        pprint(pending)
+        return pending
+
+    def prefetch(bus: ArtifactBus):
+        prefetch_script(
+            pending_matrix=bus["update_rdfs"]["pending_matrix_bioimageio"],
+            manifest=artifacts / "static_validation_artifact" / "prefetch_manifest.json",
+        )
 
-    # perform static validation for pending resources
-    static_out = static_validation_script(
-        pending_matrix=json.dumps(dict(include=pending["pending_matrix_bioimageio"].get("include", []))),
-        dist=artifacts / "static_validation_artifact",
-    )
-    print("\nstatic validation:")
-    pprint(static_out)
+    def static_validation(bus: ArtifactBus):
+        # perform static validation for pending resources
+        static_out = static_validation_script(
+            pending_matrix=bus["update_rdfs"]["pending_matrix_bioimageio"],
+            dist=artifacts / "static_validation_artifact",
+        )
+        print("\nstatic validation:")
+        pprint(static_out)
+        end_of_job(dist, always_continue)
+        return static_out
 
-    end_of_job(dist, always_continue)
     #############################
     # validate/dynamic-validation
     #############################
-    for matrix in iterate_over_gh_matrix(static_out["dynamic_test_cases"]):
-        print(
-            f"\ndynamic validation (r: {matrix['resource_id']}, v: {matrix['version_id']}, w: {matrix['weight_format']}):"
-        )
-        dynamic_validation_script(
-            dist=artifacts / "dynamic_validation_artifact",
-            resource_id=matrix["resource_id"],
-            version_id=matrix["version_id"],
-            weight_format=matrix["weight_format"],
-        )
+    def dynamic_validation(bus: ArtifactBus):
+        for matrix in items(
+            iterate_over_gh_matrix(bus["static_validation"]["dynamic_test_cases"]),
+            lambda m: f"{m['resource_id']}/{m['version_id']}/{m['weight_format']}",
+        ):
+            print(
+                f"\ndynamic validation (r: {matrix['resource_id']}, v: {matrix['version_id']}, w: {matrix['weight_format']}):"
+            )
+            dynamic_validation_script(
+                dist=artifacts / "dynamic_validation_artifact",
+                resource_id=matrix["resource_id"],
+                version_id=matrix["version_id"],
+                weight_format=matrix["weight_format"],
+            )
+
+        end_of_job(dist, always_continue)
 
-    end_of_job(dist, always_continue)
     #################
     # validate/deploy
     #################
-    prepare_to_deploy_script(local=True)
-
-    fake_deploy(dist / "gh_pages_update", gh_pages)
+    def prepare_to_deploy(bus: ArtifactBus):
+        prepare_to_deploy_script(local=True)
+        fake_deploy(dist / "gh_pages_update", gh_pages)
+        end_of_job(dist, always_continue)
 
-    end_of_job(dist, always_continue)
     ##################
     # build-collection
     ##################
-    generate_collection_rdf_and_thumbnails_script()
+    def generate_collection_rdf_and_thumbnails(bus: ArtifactBus):
+        generate_collection_rdf_and_thumbnails_script()
+        fake_deploy(dist, gh_pages)
+        if bus["update_rdfs"]["retrigger"]:
+            print("incomplete collection update. needs additional run(s).")
 
-    fake_deploy(dist, gh_pages)
-    if pending["retrigger"]:
-        print("incomplete collection update. needs additional run(s).")
+        end_of_job(dist, always_continue)
 
-    end_of_job(dist, always_continue)
+    stages = [Stage("update_partner_resources", lambda bus: update_partner_resources_script())]
+    if not skip_update_external:
+        # runs concurrently to 'update_partner_resources'
+        stages.append(Stage("update_external_resources", update_external_resources))
+
+    stages += [
+        Stage("deploy_resources", deploy_resources, needs=[s.name for s in stages]),
+        Stage("update_rdfs", update_rdfs, needs=["deploy_resources"]),
+        Stage("prefetch", prefetch, needs=["update_rdfs"]),
+        Stage("static_validation", static_validation, needs=["prefetch"]),
+        Stage("dynamic_validation", dynamic_validation, needs=["static_validation"]),
+        Stage("prepare_to_deploy", prepare_to_deploy, needs=["dynamic_validation"]),
+        Stage(
+            "generate_collection_rdf_and_thumbnails",
+            generate_collection_rdf_and_thumbnails,
+            needs=["prepare_to_deploy"],
+        ),
+    ]
+    run_stages(stages)
 
     # copy _header and index.html file in order to enable a valid bioimage.io preview
     shutil.copy(Path(__file__).parent / "../_headers", str(gh_pages / "_headers"))
     shutil.copy(Path(__file__).parent / "../index.html", str(gh_pages / "index.html"))
 
+    timings_path = artifacts / "timings.json"
+    write_timings(timings_path)
+    print(f"\ntimings (details in {timings_path}):")
+    print(format_summary())
+
 
 if __name__ == "__main__":
     typer.run(main)
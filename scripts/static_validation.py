@@ -1,23 +1,27 @@
+import json
 import shutil
 import warnings
 from functools import partialmethod
 from pathlib import Path
 from typing import Dict, List, Literal, Optional, Union
 
-import requests
 import typer
 from marshmallow import missing
 from marshmallow.utils import _Missing
 from packaging.version import Version
 from tqdm import tqdm
 
-from bare_utils import set_gh_actions_outputs
+from bare_utils import VALIDATION_STATUS_FILE_NAME, append_validation_status, set_gh_actions_outputs
 from bioimageio.spec import load_raw_resource_description, validate
 from bioimageio.spec.model.raw_nodes import Model, WeightsFormat
 from bioimageio.spec.rdf.raw_nodes import RDF_Base
 from bioimageio.spec.shared import yaml
 from bioimageio.spec.shared.raw_nodes import Dependencies, URI
-from utils import ADJECTIVES, ANIMALS, iterate_over_gh_matrix, split_animal_nickname
+from http_client import http_get
+from profiling import items
+from summary_store import open_deployed_store
+from utils import ADJECTIVES, ANIMALS, get_collection_index, iterate_over_gh_matrix, split_animal_nickname
+from validation_cache import CACHED_RESULTS_FILE_NAME, UNTESTED_WEIGHT_FORMATS
 
 tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)  # silence tqdm
 
@@ -35,7 +39,7 @@ def get_env_from_deps(deps: Dependencies):
             elif not isinstance(deps.file, URI):
                 raise TypeError(deps.file)
 
-            r = requests.get(str(deps.file))
+            r = http_get(str(deps.file))
             r.raise_for_status()
             dep_file_content = r.text
             if deps.manager == "conda":
@@ -150,7 +154,7 @@ def prepare_dynamic_test_cases(rd: RDF_Base, resource_id: str, version_id: str,
         for wf in rd.weights:
             # we skip the keras validation for now, see
             # https://github.com/bioimage-io/collection-bioimage-io/issues/16
-            if wf in ("keras_hdf5", "tensorflow_js"):
+            if wf in UNTESTED_WEIGHT_FORMATS:
                 warnings.warn(f"{wf} weights are currently not validated")
                 continue
 
@@ -179,9 +183,15 @@ def main(
         Path(__file__).parent / "../dist/updated_rdfs/rdfs",
         Path(__file__).parent / "../gh-pages/rdfs",
     ),
+    collection: Path = Path(__file__).parent / "../collection",
+    gh_pages: Path = Path(__file__).parent / "../gh-pages",
 ):
     dynamic_test_cases = []
-    for matrix in iterate_over_gh_matrix(pending_matrix):
+    # cached dynamic validation results are handed to the dynamic validation jobs
+    summary_store = open_deployed_store(gh_pages)
+    # nicknames of blocked resources may be reused
+    index = get_collection_index(collection, exclude_status=("blocked",))
+    for matrix in items(iterate_over_gh_matrix(pending_matrix), lambda m: f"{m['resource_id']}/{m['version_id']}"):
         resource_id = matrix["resource_id"]
         version_id = matrix["version_id"]
 
@@ -201,6 +211,10 @@ def main(
             assert animal in ANIMALS
             nickname_icon = rdf["config"]["bioimageio"]["nickname_icon"]
             assert nickname_icon == ANIMALS[animal]
+            resource_path = (collection / resource_id / "resource.yaml").resolve()
+            assert not index.is_taken(
+                "nickname", nickname, ignore_source=resource_path
+            ), f"nickname '{nickname}' already taken by {index.get_sources('nickname', nickname)}"
 
         # add rdf to dist (future static_validation_artifact)
         deploy_rdf_path = dist / resource_id / version_id / "rdf.yaml"
@@ -212,20 +226,38 @@ def main(
         static_summary_path = dist / resource_id / version_id / "validation_summary_static.yaml"
         static_summary_path.parent.mkdir(parents=True, exist_ok=True)
         yaml.dump(static_summary, static_summary_path)
+        append_validation_status(dist / VALIDATION_STATUS_FILE_NAME, static_summary_path, static_summary)
         if static_summary["status"] == "passed":
             # validate rdf using the latest format version
             latest_static_summary = validate(rdf_path, update_format=True)
             if latest_static_summary["status"] == "passed":
                 rd = load_raw_resource_description(rdf_path, update_to_format="latest")
                 assert isinstance(rd, RDF_Base)
-                dynamic_test_cases += prepare_dynamic_test_cases(rd, resource_id, version_id, dist)
+                version_test_cases = prepare_dynamic_test_cases(rd, resource_id, version_id, dist)
+                dynamic_test_cases += version_test_cases
+                if version_test_cases and summary_store is not None:
+                    cached_results = summary_store.get_cached_results(resource_id, version_id)
+                else:
+                    cached_results = []
+
+                if cached_results:
+                    (dist / resource_id / version_id / CACHED_RESULTS_FILE_NAME).write_text(
+                        json.dumps(cached_results, indent=2, sort_keys=True), encoding="utf-8"
+                    )
 
             if "name" not in latest_static_summary:
                 latest_static_summary[
                     "name"
                 ] = "bioimageio.spec static validation with auto-conversion to latest format"
 
-            yaml.dump(latest_static_summary, static_summary_path.with_name("validation_summary_latest_static.yaml"))
+            latest_static_summary_path = static_summary_path.with_name("validation_summary_latest_static.yaml")
+            yaml.dump(latest_static_summary, latest_static_summary_path)
+            append_validation_status(
+                dist / VALIDATION_STATUS_FILE_NAME, latest_static_summary_path, latest_static_summary
+            )
+
+    if summary_store is not None:
+        summary_store.close()
 
     out = dict(has_dynamic_test_cases=bool(dynamic_test_cases), dynamic_test_cases={"include": dynamic_test_cases})
     set_gh_actions_outputs(out)
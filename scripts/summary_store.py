@@ -0,0 +1,286 @@
+"""consolidated store of all test summaries (an SQLite database deployed next to the test_summary.yaml files)
+
+The per version test_summary.yaml files remain the source for the website; the store indexes them by
+resource/version, status, library versions and partner to answer questions like
+"which versions need to be re-evaluated with spec version X" with a single query.
+Each row records the sha256 of its test_summary.yaml; rows whose file changed since are not trusted
+(see `get_up_to_date_versions`).
+It also holds the cache of passed dynamic validation results (see `validation_cache.py`).
+
+    python scripts/summary_store.py build gh-pages  # (re)build the store from all test_summary.yaml files
+    python scripts/summary_store.py export gh-pages/test_summaries.sqlite folder  # export test_summary.yaml files
+"""
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import typer
+from bare_utils import get_sha256
+from bioimageio.spec.shared import yaml
+
+SUMMARY_STORE_FILE_NAME = "test_summaries.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    resource_id TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    rdf_sha256 TEXT,
+    status TEXT,
+    bioimageio_spec_version TEXT,
+    bioimageio_core_version TEXT,
+    summary TEXT NOT NULL,
+    test_summary_sha256 TEXT,
+    PRIMARY KEY (resource_id, version_id)
+);
+CREATE INDEX IF NOT EXISTS versions_status ON versions (status);
+CREATE INDEX IF NOT EXISTS versions_library_versions ON versions (bioimageio_spec_version, bioimageio_core_version);
+CREATE TABLE IF NOT EXISTS partner_tests (
+    resource_id TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    partner_id TEXT NOT NULL,
+    status TEXT,
+    PRIMARY KEY (resource_id, version_id, partner_id)
+);
+CREATE INDEX IF NOT EXISTS partner_tests_partner ON partner_tests (partner_id, status);
+CREATE TABLE IF NOT EXISTS dynamic_validation_cache (
+    key TEXT NOT NULL,
+    bioimageio_core_version TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (key, bioimageio_core_version)
+);
+CREATE INDEX IF NOT EXISTS dynamic_validation_cache_version ON dynamic_validation_cache (resource_id, version_id);
+"""
+
+VersionKey = Tuple[str, str]
+
+
+def get_partner_status(tests: list) -> str:
+    return "passed" if all(isinstance(t, dict) and t.get("status") == "passed" for t in tests) else "failed"
+
+
+class SummaryStore:
+    """SQLite store of test summaries; use as context manager to commit (and close) on exit"""
+
+    def __init__(self, path: Path, read_only: bool = False):
+        self.path = path
+        if read_only:
+            self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(path)
+            self.connection.executescript(SCHEMA)
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(versions)")]
+            if "test_summary_sha256" not in columns:  # store created before the column was added
+                self.connection.execute("ALTER TABLE versions ADD COLUMN test_summary_sha256 TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self.connection.close()
+
+    def close(self):
+        """commit and close"""
+        self.connection.commit()
+        self.connection.close()
+
+    def upsert(
+        self, resource_id: str, version_id: str, test_summary: Dict[str, Any], test_summary_sha256: Optional[str]
+    ):
+        """insert or update the test summary of a resource version (rows are only written if changed)
+
+        Args:
+            resource_id: resource id
+            version_id: version id
+            test_summary: test summary
+            test_summary_sha256: sha256 of the deployed test_summary.yaml file holding `test_summary`
+        """
+        summary = json.dumps(test_summary, sort_keys=True, default=str)
+        self.connection.execute(
+            "INSERT INTO versions (resource_id, version_id, rdf_sha256, status, bioimageio_spec_version, "
+            "bioimageio_core_version, summary, test_summary_sha256) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (resource_id, version_id) DO UPDATE SET "
+            "rdf_sha256=excluded.rdf_sha256, status=excluded.status, "
+            "bioimageio_spec_version=excluded.bioimageio_spec_version, "
+            "bioimageio_core_version=excluded.bioimageio_core_version, summary=excluded.summary, "
+            "test_summary_sha256=excluded.test_summary_sha256 "
+            "WHERE summary IS NOT excluded.summary OR test_summary_sha256 IS NOT excluded.test_summary_sha256",
+            (
+                resource_id,
+                version_id,
+                test_summary.get("rdf_sha256"),
+                test_summary.get("status"),
+                test_summary.get("bioimageio_spec_version"),
+                test_summary.get("bioimageio_core_version"),
+                summary,
+                test_summary_sha256,
+            ),
+        )
+        tests = test_summary.get("tests") or {}
+        partner_ids = [p for p in tests if p != "bioimageio"]
+        self.connection.execute(
+            "DELETE FROM partner_tests WHERE resource_id = ? AND version_id = ? "
+            f"AND partner_id NOT IN ({', '.join('?' * len(partner_ids))})",
+            (resource_id, version_id, *partner_ids),
+        )
+        self.connection.executemany(
+            "INSERT INTO partner_tests VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (resource_id, version_id, partner_id) DO UPDATE SET status=excluded.status "
+            "WHERE status IS NOT excluded.status",
+            [(resource_id, version_id, p, get_partner_status(tests[p])) for p in partner_ids],
+        )
+
+    def get(self, resource_id: str, version_id: str) -> Optional[Dict[str, Any]]:
+        row = self.connection.execute(
+            "SELECT summary FROM versions WHERE resource_id = ? AND version_id = ?", (resource_id, version_id)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_versions(self) -> Set[VersionKey]:
+        return set(self.connection.execute("SELECT resource_id, version_id FROM versions"))
+
+    def get_test_summary_sha256s(self) -> Dict[VersionKey, str]:
+        """sha256 of the test_summary.yaml file each stored test summary was read from or written to"""
+        try:
+            rows = self.connection.execute(
+                "SELECT resource_id, version_id, test_summary_sha256 FROM versions "
+                "WHERE test_summary_sha256 IS NOT NULL"
+            ).fetchall()
+        except sqlite3.OperationalError:  # deployed store without the column
+            return {}
+
+        return {(r_id, v_id): sha256 for r_id, v_id, sha256 in rows}
+
+    def get_outdated_versions(self, spec_version: str, core_version: str) -> Set[VersionKey]:
+        """versions last tested with another spec version or (if known) another core version"""
+        return set(
+            self.connection.execute(
+                "SELECT resource_id, version_id FROM versions WHERE bioimageio_spec_version IS NOT ? "
+                "OR (bioimageio_core_version IS NOT NULL AND bioimageio_core_version != ?)",
+                (spec_version, core_version),
+            )
+        )
+
+    def get_versions_tested_by(self, partner_id: str) -> Set[VersionKey]:
+        return set(
+            self.connection.execute(
+                "SELECT resource_id, version_id FROM partner_tests WHERE partner_id = ?", (partner_id,)
+            )
+        )
+
+    def get_passed_versions_tested_with_other_core(self, spec_version: str, core_version: str) -> Set[VersionKey]:
+        """passed versions last tested with `spec_version`, but another core version"""
+        return set(
+            self.connection.execute(
+                "SELECT resource_id, version_id FROM versions WHERE status = 'passed' AND bioimageio_spec_version = ? "
+                "AND bioimageio_core_version IS NOT NULL AND bioimageio_core_version != ?",
+                (spec_version, core_version),
+            )
+        )
+
+    def add_cached_result(self, entry: Dict[str, Any]):
+        """add a dynamic validation result to the cache (see `validation_cache.py`)"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO dynamic_validation_cache VALUES (?, ?, ?, ?, ?)",
+            (
+                entry["key"],
+                entry["bioimageio_core_version"],
+                entry["resource_id"],
+                entry["version_id"],
+                json.dumps(entry, sort_keys=True, default=str),
+            ),
+        )
+
+    def get_cached_results(self, resource_id: str, version_id: str) -> List[Dict[str, Any]]:
+        try:
+            rows = self.connection.execute(
+                "SELECT entry FROM dynamic_validation_cache WHERE resource_id = ? AND version_id = ?",
+                (resource_id, version_id),
+            ).fetchall()
+        except sqlite3.OperationalError:  # deployed store without cache
+            return []
+
+        return [json.loads(entry) for entry, in rows]
+
+    def get_cached_result_versions(self) -> Set[VersionKey]:
+        """versions with cached dynamic validation results"""
+        try:
+            return set(self.connection.execute("SELECT DISTINCT resource_id, version_id FROM dynamic_validation_cache"))
+        except sqlite3.OperationalError:  # deployed store without cache
+            return set()
+
+    def iterate_summaries(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        for resource_id, version_id, summary in self.connection.execute(
+            "SELECT resource_id, version_id, summary FROM versions ORDER BY resource_id, version_id"
+        ):
+            yield resource_id, version_id, json.loads(summary)
+
+
+def get_up_to_date_versions(store: SummaryStore, gh_pages: Path) -> Set[VersionKey]:
+    """stored versions whose deployed test_summary.yaml is unchanged since it was stored
+
+    The deployed test_summary.yaml files are the source of truth; a store overwritten by a concurrent job or not
+    updated along with a test_summary.yaml is only trusted for versions listed here.
+    """
+    up_to_date = set()
+    for (resource_id, version_id), sha256 in store.get_test_summary_sha256s().items():
+        test_summary_path = gh_pages / "rdfs" / resource_id / version_id / "test_summary.yaml"
+        if test_summary_path.exists() and get_sha256(test_summary_path) == sha256:
+            up_to_date.add((resource_id, version_id))
+
+    return up_to_date
+
+
+def open_deployed_store(gh_pages: Path) -> Optional[SummaryStore]:
+    """read-only store deployed to gh-pages (if any)"""
+    path = gh_pages / SUMMARY_STORE_FILE_NAME
+    if not path.exists():
+        return None
+
+    return SummaryStore(path, read_only=True)
+
+
+app = typer.Typer()
+
+
+@app.command()
+def build(gh_pages: Path, output: Optional[Path] = None):
+    """(re)build the store from all test_summary.yaml files in gh_pages/rdfs"""
+    output = output or gh_pages / SUMMARY_STORE_FILE_NAME
+    with SummaryStore(output) as store:
+        n = 0
+        for test_summary_path in (gh_pages / "rdfs").glob("**/test_summary.yaml"):
+            test_summary = yaml.load(test_summary_path)
+            if not isinstance(test_summary, dict) or "tests" not in test_summary:
+                continue
+
+            version_folder = test_summary_path.parent
+            store.upsert(
+                version_folder.parent.relative_to(gh_pages / "rdfs").as_posix(),
+                version_folder.name,
+                test_summary,
+                get_sha256(test_summary_path),
+            )
+            n += 1
+
+    print(f"stored {n} test summaries in {output}")
+
+
+@app.command()
+def export(store_path: Path, folder: Path):
+    """write all test summaries in the store to folder/rdfs/<resource_id>/<version_id>/test_summary.yaml"""
+    with SummaryStore(store_path, read_only=True) as store:
+        for resource_id, version_id, test_summary in store.iterate_summaries():
+            test_summary_path = folder / "rdfs" / resource_id / version_id / "test_summary.yaml"
+            test_summary_path.parent.mkdir(parents=True, exist_ok=True)
+            yaml.dump(test_summary, test_summary_path)
+
+
+if __name__ == "__main__":
+    app()
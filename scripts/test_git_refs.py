@@ -0,0 +1,46 @@
+import subprocess
+
+import pytest
+
+from git_refs import get_branches, get_refs, ls_remote
+
+
+def git(*args, cwd):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """bare repository with branches 'main' and 'auto-update-a' and tag 'v0.1' pushed from a clone"""
+    bare = tmp_path / "remote.git"
+    work = tmp_path / "work"
+    git("init", "--bare", str(bare), cwd=tmp_path)
+    git("init", str(work), cwd=tmp_path)
+    git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "--allow-empty", "-m", "init", cwd=work)
+    git("tag", "v0.1", cwd=work)
+    git("push", str(bare), "HEAD:refs/heads/main", "HEAD:refs/heads/auto-update-a", "v0.1", cwd=work)
+    yield bare, git("rev-parse", "HEAD", cwd=work)
+    get_refs.cache_clear()
+
+
+EXPECTED_NAMES = {"refs/heads/main", "refs/heads/auto-update-a", "refs/tags/v0.1"}
+
+
+def test_ls_remote(remote):
+    bare, sha = remote
+    assert ls_remote(bare.as_uri()) == {name: sha for name in EXPECTED_NAMES}
+
+
+@pytest.mark.parametrize("pack", [False, True])
+def test_local_refs(remote, pack):
+    bare, sha = remote
+    if pack:
+        git("pack-refs", "--all", cwd=bare)
+
+    assert get_refs(str(bare)) == {name: sha for name in EXPECTED_NAMES}
+    assert get_branches("auto-update-", remote=str(bare)) == ["auto-update-a"]
+
+
+def test_ls_remote_raises_for_nonexistent_remote(tmp_path):
+    with pytest.raises(RuntimeError):
+        ls_remote((tmp_path / "nonexistent.git").as_uri())
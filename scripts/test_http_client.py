@@ -0,0 +1,62 @@
+import socket
+import threading
+
+import pytest
+import requests
+import typer
+
+from download_documentation import DocumentationCache, DocumentationFetcher
+from http_client import HttpClient
+from offline import StandInServer, get_synthetic_rdf, redirect_to
+from run_main_ci_equivalent_local import main as run_main_ci_equivalent_local
+
+RECORDS_URL = "https://zenodo.org/api/records?q=keywords:bioimage.io&page=1&size=10"
+
+
+@pytest.fixture
+def faulty_server():
+    with StandInServer(n_synthetic_records=30, fault_rate=0.5) as server, redirect_to(server):
+        yield server
+
+
+def test_retries_injected_faults(faulty_server):
+    client = HttpClient(backoff=0.0, max_retries=20, failure_threshold=100, sleep=lambda s: None)
+    for _ in range(20):
+        r = client.get(RECORDS_URL)
+        assert r.status_code == 200
+        assert len(r.json()["hits"]["hits"]) == 10
+
+    assert faulty_server.n_faults > 0
+
+
+def test_documentation_fetcher_retries_injected_faults(faulty_server, tmp_path):
+    client = HttpClient(backoff=0.0, max_retries=20, failure_threshold=100, sleep=lambda s: None)
+    fetcher = DocumentationFetcher(DocumentationCache(tmp_path / "cache"), max_workers=4, max_per_host=2, client=client)
+    uris = [f"https://zenodo.org/api/records/{recid}/files/rdf.yaml/content" for recid in range(9000001, 9000011)]
+    outputs = {uri: [tmp_path / str(i) / "documentation.md"] for i, uri in enumerate(uris)}
+    fetcher.deploy_all(outputs)
+    assert dict(fetcher.counts) == {"downloaded": len(uris)}
+    for uri, (output,) in outputs.items():
+        assert output.read_text(encoding="utf-8") == get_synthetic_rdf(int(uri.split("/")[5]))
+
+    assert faulty_server.n_faults > 0
+
+
+def test_stalled_connection_times_out():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections = []
+    accepting = threading.Thread(target=lambda: connections.append(server.accept()), daemon=True)
+    accepting.start()
+    client = HttpClient(backoff=0.0, max_retries=0, timeout=0.2, sleep=lambda s: None)
+    try:
+        with pytest.raises(requests.Timeout):
+            client.get(f"http://127.0.0.1:{server.getsockname()[1]}/")
+    finally:
+        server.close()
+
+
+def test_fault_rate_requires_stand_in_server():
+    with pytest.raises(typer.BadParameter):
+        run_main_ci_equivalent_local(fault_rate=0.1)
@@ -0,0 +1,126 @@
+import json
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytest
+
+import zenodo
+from zenodo import stream_json_array
+
+
+def iterate_chunks(text: str, chunk_sizes):
+    pos = 0
+    for size in chunk_sizes:
+        if pos >= len(text):
+            break
+
+        yield text[pos : pos + size]
+        pos += size
+
+    if pos < len(text):
+        yield text[pos:]
+
+
+ITEMS = [
+    -0.5,
+    12345678.0,
+    1e-7,
+    -2.5e10,
+    0,
+    -17,
+    'a "quoted" string with \\ and ü',
+    "",
+    True,
+    False,
+    None,
+    {"id": 1, "metadata": {"keywords": ["bioimage.io"], "score": -1.25e-3}},
+    [],
+    [1, [2.0, "3"], {}],
+]
+
+
+@pytest.mark.parametrize("items", [[-0.5], [12345678.0], ITEMS])
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_stream_json_array_fixed_chunk_sizes(items, indent, chunk_size):
+    text = json.dumps({"aggregations": {"hits": [0]}, "hits": {"total": len(items), "hits": items}}, indent=indent)
+    chunks = iterate_chunks(text, [chunk_size] * len(text))
+    assert list(stream_json_array(chunks, ("hits", "hits"))) == items
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_stream_json_array_random_chunk_sizes(seed):
+    rng = random.Random(seed)
+    items = rng.sample(ITEMS, rng.randint(0, len(ITEMS)))
+    text = json.dumps({"hits": {"hits": items, "total": len(items)}}, indent=rng.choice([None, 1]))
+    chunks = iterate_chunks(text, [rng.randint(1, 8) for _ in text])
+    assert list(stream_json_array(chunks, ("hits", "hits"))) == items
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.reason = "Service Unavailable"
+
+    def close(self):
+        pass
+
+
+def test_iterate_record_pages_raises_on_failed_page(monkeypatch):
+    monkeypatch.setattr(zenodo, "http_get", lambda url, **kwargs: FakeResponse(503))
+    with pytest.raises(zenodo.IncompleteQueryError):
+        next(zenodo.iterate_record_pages("q"))
+
+
+WINDOWS = [(datetime(2023, 1, 1), datetime(2024, 1, 1)), (datetime(2022, 1, 1), datetime(2023, 1, 1))]
+WINDOWS += [(datetime(2021, 1, 1), datetime(2022, 1, 1))]
+
+
+def fake_partitioned_query(monkeypatch, records: Dict[str, List[dict]], counts: Optional[List[int]] = None):
+    """serve `records` per window query; returns the number of pages decoded per window query"""
+    counts = counts or [len(records[zenodo.get_window_query("q", s, e)]) for s, e in WINDOWS]
+    monkeypatch.setattr(zenodo, "partition_time_range", lambda *args: [(s, e, c) for (s, e), c in zip(WINDOWS, counts)])
+    n_pages = {q: 0 for q in records}
+
+    def iterate_record_pages(q, size):
+        for start in range(0, len(records[q]) + 1, size):
+            n_pages[q] += 1
+            yield iter(records[q][start : start + size])
+
+    monkeypatch.setattr(zenodo, "iterate_record_pages", iterate_record_pages)
+    return n_pages
+
+
+def make_records(n_per_window: int, duplicates: int = 0):
+    records = {}
+    for i, (s, e) in enumerate(WINDOWS):
+        first = i * n_per_window - (duplicates if i else 0)
+        records[zenodo.get_window_query("q", s, e)] = [dict(id=j) for j in range(first, (i + 1) * n_per_window)]
+
+    return records
+
+
+def test_iterate_records_partitioned_yields_windows_in_order_without_duplicates(monkeypatch):
+    fake_partitioned_query(monkeypatch, make_records(7, duplicates=2))
+    hits = list(zenodo.iterate_records_partitioned("q", max_workers=2, size=3))
+    assert [h["id"] for h in hits] == list(range(21))
+
+
+def test_iterate_records_partitioned_buffers_at_most_two_pages_per_waiting_window(monkeypatch):
+    records = make_records(30)
+    n_pages = fake_partitioned_query(monkeypatch, records)
+    hits = zenodo.iterate_records_partitioned("q", max_workers=3, size=3)
+    assert next(hits)["id"] == 0
+    time.sleep(0.5)  # give the workers of the next windows time to run ahead
+    assert all(n <= 2 for q, n in n_pages.items() if q != zenodo.get_window_query("q", *WINDOWS[0]))
+    assert [h["id"] for h in hits] == list(range(1, 90))
+
+
+def test_iterate_records_partitioned_raises_on_incomplete_window(monkeypatch):
+    fake_partitioned_query(monkeypatch, make_records(5), counts=[5, 6, 5])
+    hits = zenodo.iterate_records_partitioned("q", max_workers=2, size=2)
+    assert [next(hits)["id"] for _ in range(10)] == list(range(10))
+    with pytest.raises(zenodo.IncompleteQueryError):
+        next(hits)
@@ -1,17 +1,39 @@
 import json
-import subprocess
 import warnings
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from pprint import pprint
-from typing import DefaultDict, Dict, List, Literal, Optional, Tuple, Union
+from typing import Any, DefaultDict, Dict, List, Literal, Optional, Sequence, Tuple, Union
 
-import requests
 import typer
 from bare_utils import set_gh_actions_outputs
 from bs4 import BeautifulSoup
-from utils import ADJECTIVES, ANIMALS, enforce_block_style_resource, get_animal_nickname, split_animal_nickname, yaml
+from download_stats import (
+    DOWNLOAD_STATS_FILE_NAME,
+    DownloadStatsBuilder,
+    aggregate_per_type,
+    get_download_counts,
+    save_stats,
+)
+from git_refs import get_branches
+from http_client import http_get
+from utils import (
+    ADJECTIVES,
+    ANIMALS,
+    UniquenessIndex,
+    enforce_block_style_resource,
+    get_animal_nickname,
+    get_collection_index,
+    split_animal_nickname,
+    yaml,
+)
+from zenodo import BIOIMAGEIO_QUERY, IncompleteQueryError, iterate_records_partitioned
+
+
+HARVEST_CURSOR_FILE_NAME = "zenodo_harvest_cursor.json"
+# records created shortly before the cursor are harvested again (zenodo's sort order is not strict)
+HARVEST_OVERLAP = timedelta(days=2)
 
 
 def update_resource(
@@ -24,14 +46,23 @@ def update_resource(
     new_version: dict,
     resource_output_path: Path,
     rdf: dict,
+    index: UniquenessIndex,
+    resources: Dict[str, dict],
 ) -> Union[dict, Literal["old_hit", "blocked"]]:
-    if resource_output_path.exists():
-        # maybe we have more than one new versions, so we should update the resource that is already written to output
-        resource_path = resource_output_path
-
-    if resource_path.exists():
+    """add a new version to the resource (kept in `resources` to accumulate all new versions before writing it)"""
+    if resource_id in resources:
+        # we have more than one new version
+        resource = resources[resource_id]
+    elif resource_output_path.exists():
+        resource = yaml.load(resource_output_path)
+    elif resource_path.exists():
         resource = yaml.load(resource_path)
+    else:
+        resource = None
+
+    if resource is not None:
         assert isinstance(resource, dict)
+        resources[resource_id] = resource
         if resource["status"] == "blocked":
             return "blocked"
         elif resource["status"] in ("accepted", "pending"):
@@ -46,10 +77,8 @@ def update_resource(
                 # fetched resource is known
                 return "old_hit"
 
-        # extend resource by new version
+        # extend resource by new version (versions are sorted when writing the resource)
         resource["versions"].insert(0, new_version)
-        # make sure latest is first
-        resource["versions"].sort(key=lambda v: v["created"], reverse=True)
         resource["type"] = resource_type
     else:  # create new resource
         resource = {
@@ -59,6 +88,7 @@ def update_resource(
             "doi": resource_doi,
             "type": resource_type,
         }
+        resources[resource_id] = resource
 
         # check/set nickname and nickname_icon
         def get_config_bioimageio(key):
@@ -76,19 +106,23 @@ def update_resource(
         if resource_type == "model":
             if existing_nickname is None:
                 # suggest nickname and nickname_icon if missing (maybe we overwrite nickname_icon)
-                nickname, nickname_icon = get_animal_nickname()
+                nickname, nickname_icon = get_animal_nickname(index, resource_path)
             else:
                 try:
                     adjective, animal = split_animal_nickname(existing_nickname)
                     assert adjective in ADJECTIVES
                     assert animal in ANIMALS
+                    assert not index.is_taken(
+                        "nickname", existing_nickname, ignore_source=resource_path
+                    ), f"nickname {existing_nickname} already taken by {index.get_sources('nickname', existing_nickname)}"
                 except Exception as e:
                     print("error", e)
                     # suggest to overwrite nickname and nickname_icon if nickname is invalid
-                    nickname, nickname_icon = get_animal_nickname()
+                    nickname, nickname_icon = get_animal_nickname(index, resource_path)
                 else:
                     nickname = existing_nickname
                     nickname_icon = ANIMALS[animal]  # maybe we overwrite nickname_icon; it needs to match animal
+                    index.add("nickname", nickname, resource_path)
         else:
             # set invalid nickname if any nickname was specified for a non-model resource
             if existing_nickname is not None:
@@ -113,9 +147,14 @@ def update_resource(
         del resource["doi"]
 
     assert isinstance(resource, dict)
+    return resource
+
+
+def write_resource(resource: dict, resource_output_path: Path):
+    # make sure latest is first
+    resource["versions"].sort(key=lambda v: v["created"], reverse=True)
     resource_output_path.parent.mkdir(parents=True, exist_ok=True)
     yaml.dump(enforce_block_style_resource(resource), resource_output_path)
-    return resource
 
 
 def update_with_new_version(
@@ -133,8 +172,22 @@ def update_with_new_version(
             # only expect non empty strings and prepend single '@'
             maintainers = ["@" + m.strip("@") for m in maintainers if isinstance(m, str) and m]
 
-    new_version["maintainers"] = maintainers
-    updated_resources[resource_id].append(new_version)
+    updated_resources[resource_id].append(dict(new_version, maintainers=maintainers))
+
+
+def get_update_cost(rdf: Optional[dict], rdf_size: int) -> float:
+    """rough cost of validating a new version (each weight format is tested separately)"""
+    weights = rdf.get("weights") if isinstance(rdf, dict) else None
+    n_weight_formats = len(weights) if isinstance(weights, dict) else 0
+    return 1.0 + rdf_size / 10_000 + n_weight_formats
+
+
+def load_harvest_cursor(gh_pages: Path) -> Optional[Dict[str, Any]]:
+    path = gh_pages / HARVEST_CURSOR_FILE_NAME
+    if not path.exists():
+        return None
+
+    return json.loads(path.read_text(encoding="utf-8"))
 
 
 def update_from_zenodo(
@@ -142,24 +195,30 @@ def update_from_zenodo(
     dist: Path,
     updated_resources: DefaultDict[str, List[Dict[str, Union[str, datetime]]]],
     ignore_status_5xx: bool,
+    gh_pages: Path,
+    update_costs: Optional[DefaultDict[str, float]] = None,
+    full_resync: bool = False,
+    max_workers: int = 4,
 ):
-    download_counts: Dict[str, int] = {}
-    for page in range(1, 1000):
-        zenodo_request = (
-            f"https://zenodo.org/api/records?&sort=newest&page={page}&size=1000&all_versions=1&q=keywords:bioimage.io"
-        )
-        r = requests.get(zenodo_request)
-        if not r.status_code == 200:
-            print(f"Could not get zenodo records page {page}: {r.status_code}: {r.reason}")
-            break
-
-        print(f"Collecting items from zenodo: {zenodo_request}")
-
-        hits = r.json()["hits"]["hits"]
-        if not hits:
-            break
-
-        for hit in hits:
+    """harvest zenodo records (newest first) down to the harvest cursor of the previous run (unless `full_resync`)"""
+    download_stats = DownloadStatsBuilder()
+    index = get_collection_index(collection)
+    cursor = None if full_resync else load_harvest_cursor(gh_pages)
+    if cursor is None:
+        print("full zenodo harvest")
+        stop_before = None
+    else:
+        stop_before = datetime.fromisoformat(cursor["created"]) - HARVEST_OVERLAP
+        print(f"incremental zenodo harvest of records created after {stop_before}")
+
+    newest: Optional[Tuple[datetime, int]] = None  # (created, id) of newest harvested record
+    oldest_failed: Optional[datetime] = None  # oldest record to harvest again next time
+    # oldest new version not yet in the collection (its auto-update PR might not be scheduled, open or closed unmerged)
+    oldest_unmerged: Optional[datetime] = None
+    resources: Dict[str, dict] = {}  # resources by id, updated with all new versions before being written once
+    complete = True  # all records created after `stop_before` were harvested
+    try:
+        for hit in iterate_records_partitioned(BIOIMAGEIO_QUERY, start=stop_before, max_workers=max_workers):
             if "backup.bioimage.io" in hit["metadata"]["keywords"]:
                 continue  # ignoring backups from the new S3 collection
 
@@ -167,6 +226,7 @@ def update_from_zenodo(
             doi: str = hit["doi"]  # "version" doi
             created = datetime.fromisoformat(hit["created"]).replace(tzinfo=None)
             assert isinstance(created, datetime), created
+            newest = max(newest or (created, hit["id"]), (created, hit["id"]))
             resource_path = collection / resource_doi / "resource.yaml"
             resource_output_path = dist / resource_doi / "resource.yaml"
             version_name = f"version from {hit['metadata']['publication_date']}"
@@ -176,6 +236,7 @@ def update_from_zenodo(
                 if (file_hit["key"] == "rdf.yaml" or file_hit["key"].endswith(".bioimageio.yaml"))
             ]
             rdf = {}
+            rdf_size = 0
             rdf_source = "unknown"
             name = doi
             resource_type = "unknown"
@@ -184,14 +245,16 @@ def update_from_zenodo(
                     print("found multiple 'rdf.yaml' sources?!?")
 
                 rdf_source = sorted(rdf_urls)[0]
-                r = requests.get(rdf_source)
+                r = http_get(rdf_source)
                 try:
                     r.raise_for_status()
                 except Exception as e:
                     print(f"Failed to download rdf: {e}")
                     if ignore_status_5xx and r.status_code // 100 == 5:
+                        oldest_failed = min(oldest_failed or created, created)
                         continue
                 else:
+                    rdf_size = len(r.content)
                     try:
                         rdf = yaml.load(r.text)
                         assert isinstance(rdf, dict)
@@ -203,13 +266,7 @@ def update_from_zenodo(
                         resource_type = rdf.get("type")
 
             version_id = str(hit["id"])
-            try:
-                download_count = hit["stats"]["unique_downloads"]
-            except Exception as e:
-                warnings.warn(f"Could not determine download count: {e}")
-                download_count = 1
-
-            download_counts[resource_doi] = download_count
+            download_stats.append_hit(hit, resource_type)
 
             new_version = {
                 "version_id": version_id,
@@ -230,51 +287,118 @@ def update_from_zenodo(
                 new_version=new_version,
                 resource_output_path=resource_output_path,
                 rdf=rdf,
+                index=index,
+                resources=resources,
             )
             if resource not in ("blocked", "old_hit"):
                 assert isinstance(resource, dict)
                 update_with_new_version(new_version, resource_doi, rdf, updated_resources)
+                oldest_unmerged = min(oldest_unmerged or created, created)
+                if update_costs is not None:
+                    update_costs[resource_doi] += get_update_cost(rdf, rdf_size)
+    except IncompleteQueryError as e:
+        print(f"Incomplete zenodo harvest: {e}")
+        complete = False
+
+    for resource_id in updated_resources:
+        write_resource(resources[resource_id], dist / resource_id / "resource.yaml")
 
     with Path("download_counts_offsets.json").open() as f:
         download_counts_offsets = json.load(f)
 
-    download_counts = {k: v + download_counts_offsets.get(k, 0) for k, v in download_counts.items()}
-
+    stats = download_stats.to_table()
+    download_counts = get_download_counts(stats, download_counts_offsets)
     dist.mkdir(parents=True, exist_ok=True)
+    if stop_before is None and complete:
+        print("download counts per resource type:")
+        pprint(aggregate_per_type(download_counts, stats))
+        save_stats(stats, dist / DOWNLOAD_STATS_FILE_NAME)
+    else:
+        # an incremental (or incomplete) harvest only sees the newest versions;
+        # keep previous counts and statistics of known resources (no new snapshot of the statistics)
+        previous_download_counts_path = gh_pages / "download_counts.json"
+        if previous_download_counts_path.exists():
+            download_counts.update(json.loads(previous_download_counts_path.read_text(encoding="utf-8")))
+
     with (dist / "download_counts.json").open("w", encoding="utf-8") as f:
         json.dump(download_counts, f, indent=2, sort_keys=True)
 
+    # next harvest continues from the newest record, but not past the oldest record that failed to be harvested or
+    # the oldest new version that is not yet part of the collection (to find it again, e.g. after its auto-update PR
+    # was closed without merging); after an incomplete harvest older records are missing and the cursor is kept
+    if not complete:
+        next_cursor = cursor
+    elif newest is not None:
+        next_cursor = dict(created=newest[0].isoformat(), id=newest[1])
+        hold = min(oldest_failed or newest[0], oldest_unmerged or newest[0])
+        if hold < newest[0]:
+            next_cursor = dict(created=hold.isoformat(), id=None)
+    else:
+        next_cursor = cursor
+
+    if next_cursor is not None:
+        (dist / HARVEST_CURSOR_FILE_NAME).write_text(json.dumps(next_cursor, indent=2), encoding="utf-8")
+
+
+def schedule_updates(
+    updated_resources: Dict[str, List[Dict[str, Union[str, datetime]]]],
+    update_costs: Dict[str, float],
+    pending_branches: Sequence[str],
+    max_resource_count: int,
+    max_wait: timedelta = timedelta(days=7),
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """select resources to open auto-update PRs for
+
+    Resources with a pending auto-update branch are skipped. Remaining resources are ranked by their update cost,
+    discounted by how long their oldest new version has been waiting; resources waiting longer than `max_wait`
+    are scheduled first (oldest first).
+    """
+    now = now or datetime.now()
+    candidates = [r_id for r_id in updated_resources if f"auto-update-{r_id}" not in pending_branches]
+
+    def get_priority(r_id: str):
+        oldest = min(datetime.fromisoformat(str(v["created"])) for v in updated_resources[r_id])
+        waiting = now - oldest
+        if waiting >= max_wait:
+            return 0, -waiting.total_seconds(), r_id
+
+        return 1, update_costs.get(r_id, 1.0) / (1 + waiting / max_wait), r_id
+
+    return sorted(candidates, key=get_priority)[:max_resource_count]
+
 
 def main(
     collection: Path = Path(__file__).parent / "../collection",
     dist: Path = Path(__file__).parent / "../dist",
     max_resource_count: int = 3,
     ignore_status_5xx: bool = False,
+    gh_pages: Path = Path(__file__).parent / "../gh-pages",
+    max_wait_days: float = 7.0,  # resources waiting longer for an auto-update PR are scheduled first
+    full_resync: bool = False,  # harvest all zenodo records (not only records newer than the harvest cursor)
+    max_query_workers: int = 4,  # number of zenodo time windows queried in parallel
+    remote: str = "origin",  # git remote (or path to a local repository) to look for pending auto-update branches
 ):
     updated_resources: DefaultDict[str, List[Dict[str, Union[str, datetime]]]] = defaultdict(list)
-    update_from_zenodo(collection, dist, updated_resources, ignore_status_5xx)
+    update_costs: DefaultDict[str, float] = defaultdict(float)
+    update_from_zenodo(
+        collection, dist, updated_resources, ignore_status_5xx, gh_pages, update_costs, full_resync, max_query_workers
+    )
+    print(f"{len(updated_resources)} resources to update:")
+    pprint(list(updated_resources))
+
+    # skip pending resources (resources for which an auto-update-<resource_id> branch already exists)
+    pending_branches = get_branches("auto-update-", remote=remote)
+    print("Found existing auto-update branches:")
+    pprint(pending_branches)
 
     # limit the number of PRs created
-    oldest_updated_resources: List[Tuple[str, List[Dict[str, str]]]] = sorted(  # type: ignore
-        updated_resources.items(), key=lambda kv: (min([vv["created"] for vv in kv[1]]), kv[0])
+    scheduled = schedule_updates(
+        updated_resources, update_costs, pending_branches, max_resource_count, timedelta(days=max_wait_days)
     )
-    print(f"{len(oldest_updated_resources)} resources to update:")
-    pprint(list(map(lambda kv: kv[0], oldest_updated_resources)))
-    limited_updated_resources = dict(oldest_updated_resources[:max_resource_count])
-    print(f"limited to max {max_resource_count} of resources with auto-update branches (starting with oldest):")
-    pprint(list(limited_updated_resources.keys()))
-
-    # remove pending resources (resources for which an auto-update-<resource_id> branch already exists)
-    subprocess.run(["git", "fetch"])
-    remote_branch_proc = subprocess.run(["git", "branch", "-r"], capture_output=True, text=True)
-    remote_branches = [rb for rb in remote_branch_proc.stdout.split() if rb.startswith("origin/auto-update-")]
-    print("Found existing auto-update branches:")
-    pprint(remote_branches)
-    limited_updated_resources = {
-        k: v for k, v in limited_updated_resources.items() if f"origin/auto-update-{k}" not in remote_branches
-    }
-    print("Resources to open a new PR for:")
-    pprint(list(limited_updated_resources.keys()))
+    limited_updated_resources = {r_id: updated_resources[r_id] for r_id in scheduled}
+    print(f"Resources to open a new PR for (max {max_resource_count}):")
+    pprint({r_id: update_costs[r_id] for r_id in scheduled})
 
     updates = [
         {
@@ -5,7 +5,15 @@ from pathlib import Path
 import typer
 
 from bioimageio.spec import __version__ as bioimageio_spec_version
-from utils import enforce_block_style_resource, resolve_partners, write_rdfs_for_resource, yaml
+from profiling import items
+from utils import (
+    WriteCounts,
+    dump_yaml_if_changed,
+    enforce_block_style_resource,
+    resolve_partners,
+    write_rdfs_for_resource,
+    yaml,
+)
 
 
 def main(
@@ -40,11 +48,15 @@ def main(
                 updated_partner_resources.append(dict(status="deleted", id=r_id))
 
     # update resource.yaml for updated partner resources
-    for r in updated_partner_resources:
+    counts = WriteCounts()
+    for r in items(updated_partner_resources, lambda r: r["id"]):
         r_path = dist / "partner_collection" / r["id"] / "resource.yaml"
-        r_path.parent.mkdir(exist_ok=True, parents=True)
-        yaml.dump(enforce_block_style_resource(r), r_path)
-        write_rdfs_for_resource(resource=r, dist=dist)
+        dump_yaml_if_changed(
+            enforce_block_style_resource(r), r_path, compare_to=gh_pages / r_path.relative_to(dist), counts=counts
+        )
+        write_rdfs_for_resource(resource=r, dist=dist, gh_pages=gh_pages, counts=counts)
+
+    print(f"partner resource.yaml and rdf.yaml: {counts}")
 
     missing_logos = [p["id"] for p in partners if "logo" not in p]
     assert not missing_logos, missing_logos
@@ -6,11 +6,14 @@ from typing import Dict, List, Optional
 
 import typer
 
-from bare_utils import set_gh_actions_outputs
+from bare_utils import get_sha256, set_gh_actions_outputs
 from bioimageio.core import __version__ as core_version
 from bioimageio.spec import __version__ as spec_version
 from bioimageio.spec.shared import yaml
-from utils import iterate_known_resources, write_rdfs_for_resource
+from profiling import items
+from summary_store import get_up_to_date_versions, open_deployed_store
+from utils import WriteCounts, iterate_known_resources, write_rdfs_for_resource
+from validation_cache import DEFAULT_CORE_COMPATIBILITY, is_covered
 
 
 def dict_eq_wo_keys(a: dict, b: dict, *ignore_keys):
@@ -22,12 +25,24 @@ def dict_eq_wo_keys(a: dict, b: dict, *ignore_keys):
 PARTNERS_TEST_TYPES: Dict[str, List[str]] = dict(ilastik=["model"])
 
 
+def is_covered_by_cache(cached_results: Optional[List[dict]], rdf_path: Path, core_compatibility: str) -> bool:
+    """if all dynamic tests of an rdf have cached results compatible with the installed bioimageio.core"""
+    if not cached_results:
+        return False
+
+    rdf = yaml.load(rdf_path)
+    weights = rdf.get("weights") if isinstance(rdf, dict) else None
+    weight_formats = list(weights) if isinstance(weights, dict) else []
+    return is_covered(cached_results, get_sha256(rdf_path), weight_formats, core_version, core_compatibility)
+
+
 def main(
     dist: Path = Path(__file__).parent / "../dist/updated_rdfs",
     collection: Path = Path(__file__).parent / "../collection",
     last_collection: Path = Path(__file__).parent / "../last_ci_run/collection",
     gh_pages: Path = Path(__file__).parent / "../gh-pages",
     branch: str = "",
+    core_compatibility: str = DEFAULT_CORE_COMPATIBILITY,
 ):
     """write updated rdfs to dist
 
@@ -38,6 +53,8 @@ def main(
         gh_pages: directory with gh-pages checked out
         branch: (used in auto-update PR) If branch is 'auto-update-{resource_id} it is used to get resource_id
                 and limit the update process to that resource.
+        core_compatibility: policy for cached dynamic validation results of other bioimageio.core versions
+                            ('exact' or 'patch'); versions with compatible cached results are not re-evaluated.
 
     """
     branch = branch.replace("refs/heads/", "")
@@ -48,10 +65,69 @@ def main(
 
     dist.mkdir(parents=True, exist_ok=True)
 
+    # versions with an up-to-date test summary in the store (others fall back to reading their test_summary.yaml)
+    store = open_deployed_store(gh_pages)
+    if store is None:
+        stored, outdated, tested_by, cached_results = set(), set(), {}, {}
+    else:
+        with store:
+            stored = get_up_to_date_versions(store, gh_pages)
+            outdated = store.get_outdated_versions(spec_version, core_version)
+            tested_by = {partner_id: store.get_versions_tested_by(partner_id) for partner_id in PARTNERS_TEST_TYPES}
+            # cached dynamic validation results of versions outdated only by their core version
+            # and of versions whose test summary is read from test_summary.yaml
+            cached = store.get_passed_versions_tested_with_other_core(spec_version, core_version)
+            cached |= store.get_cached_result_versions() - stored
+            cached_results = {k: store.get_cached_results(*k) for k in cached}
+
+    def get_reeval_partners(resource_id: str, version_id: str, resource_type: str) -> List[str]:
+        """partners ('bioimageio' for the bioimageio.core tests) that need to reevaluate a deployed and tested version"""
+        rdf_path = gh_pages / "rdfs" / resource_id / version_id / "rdf.yaml"
+        test_summary_path = rdf_path.with_name("test_summary.yaml")
+        partners = []
+        if (resource_id, version_id) in stored:
+            # query test summary store
+            if (resource_id, version_id) in outdated and not is_covered_by_cache(
+                cached_results.get((resource_id, version_id)), rdf_path, core_compatibility
+            ):
+                partners.append("bioimageio")
+
+            for partner_id, partner_val_types in PARTNERS_TEST_TYPES.items():
+                if (resource_id, version_id) not in tested_by[partner_id] and resource_type in partner_val_types:
+                    partners.append(partner_id)
+        else:
+            test_summary: Optional[dict] = yaml.load(test_summary_path)
+            if not (isinstance(test_summary, dict) and "tests" in test_summary):
+                warnings.warn(f"Ignoring invalid test summary {test_summary}")
+                test_summary = None
+
+            # check bioimageio library versions in test summary
+            if test_summary is not None:
+                last_spec_version = test_summary.get("bioimageio_spec_version")
+                last_core_version = test_summary.get("bioimageio_core_version")
+                if last_spec_version != spec_version:
+                    partners.append("bioimageio")
+                elif last_core_version is not None and last_core_version != core_version:
+                    if test_summary.get("status") != "passed" or not is_covered_by_cache(
+                        cached_results.get((resource_id, version_id)), rdf_path, core_compatibility
+                    ):
+                        partners.append("bioimageio")
+
+            # check if partner test is present if it should be
+            for partner_id, partner_val_types in PARTNERS_TEST_TYPES.items():
+                if (not test_summary or partner_id not in test_summary["tests"]) and resource_type in partner_val_types:
+                    partners.append(partner_id)
+
+        return partners
+
     retrigger = False
+    rdf_counts = WriteCounts()
     pending_include = defaultdict(list)  # include section of gh style matrix for each partner and bioimageio
-    for r in iterate_known_resources(
-        collection=collection, gh_pages=gh_pages, resource_id=resource_id_pattern, status="accepted"
+    for r in items(
+        iterate_known_resources(
+            collection=collection, gh_pages=gh_pages, resource_id=resource_id_pattern, status="accepted"
+        ),
+        lambda r: r.resource_id,
     ):
         if r.partner_resource:
             old_r_path = gh_pages / "partner_collection" / r.resource_id / "resource.yaml"
@@ -67,11 +143,20 @@ def main(
             old_r_info = {"versions": []}
 
         limited_reeval = defaultdict(list)
+        unchanged_versions = []  # deployed and tested versions without update
         if updated_resource_info:
-            updated_versions = write_rdfs_for_resource(resource=r.info, dist=dist)
+            updated_versions = write_rdfs_for_resource(resource=r.info, dist=dist, gh_pages=gh_pages, counts=rdf_counts)
+            for v in r.info.get("versions", []):
+                rdf_path = gh_pages / "rdfs" / r.resource_id / v["version_id"] / "rdf.yaml"
+                if (
+                    v["status"] == "accepted"
+                    and v["version_id"] not in updated_versions
+                    and rdf_path.with_name("test_summary.yaml").exists()
+                ):
+                    unchanged_versions.append(v["version_id"])
         else:
             updated_versions = []
-            # check for each version if an update occurred or if only specific partners need to reevaluate
+            # check for each version if an update occurred
             for v in r.info.get("versions", []):
                 if v["status"] != "accepted":
                     continue
@@ -87,37 +172,20 @@ def main(
                         old_v for old_v in old_r_info.get("versions", []) if old_v["version_id"] == version_id
                     ]
                     version_has_update = not matching_old_versions or matching_old_versions[0] != v
-                    if not version_has_update:
-                        if test_summary_path.exists():
-                            test_summary: Optional[dict] = yaml.load(test_summary_path)
-                            if not (isinstance(test_summary, dict) and "tests" in test_summary):
-                                warnings.warn(f"Ignoring invalid test summary {test_summary}")
-                                test_summary = None
-                        else:
-                            test_summary = None
-
-                        # check bioimageio library versions in test summary
-                        if test_summary is not None:
-                            last_spec_version = test_summary.get("bioimageio_spec_version")
-                            last_core_version = test_summary.get("bioimageio_core_version")
-                            if last_spec_version != spec_version or (
-                                last_core_version is not None and last_core_version != core_version
-                            ):
-                                limited_reeval["bioimageio"].append(version_id)
-
-                        # check if partner test is present if it should be
-                        for partner_id, partner_val_types in PARTNERS_TEST_TYPES.items():
-                            if (not test_summary or partner_id not in test_summary["tests"]) and r.info.get(
-                                "type", "general"
-                            ) in partner_val_types:
-                                limited_reeval[partner_id].append(version_id)
                 else:
                     version_has_update = True
 
                 if version_has_update:
                     updated_versions += write_rdfs_for_resource(
-                        resource=r.info, dist=dist, only_for_version_id=version_id
+                        resource=r.info, dist=dist, only_for_version_id=version_id, gh_pages=gh_pages, counts=rdf_counts
                     )
+                else:
+                    unchanged_versions.append(version_id)
+
+        # check if specific partners need to reevaluate unchanged versions
+        for version_id in unchanged_versions:
+            for partner_id in get_reeval_partners(r.resource_id, version_id, r.info.get("type", "general")):
+                limited_reeval[partner_id].append(version_id)
 
         # add to 'include' value of a gh style matrix
         for v_id in updated_versions:
@@ -135,6 +203,8 @@ def main(
             retrigger = True
             break
 
+    print(f"rdf.yaml: {rdf_counts}")
+
     # create gh style matrices with 'include'
     pending_matrices = {
         "include": [
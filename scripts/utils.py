@@ -1,9 +1,11 @@
 import copy
 import dataclasses
+import io
 import json
 import pathlib
 import shutil
 import warnings
+from functools import lru_cache
 from hashlib import sha256
 from itertools import product
 from pathlib import Path, PurePosixPath
@@ -12,7 +14,8 @@ from urllib.parse import urlsplit
 
 import numpy
 import requests
-from bare_utils import DEPLOYED_BASE_URL, GH_API_URL
+from bare_utils import DEPLOYED_BASE_URL, GH_API_URL, get_sha256
+from http_client import http_get
 from bioimageio.spec import (
     load_raw_resource_description,
     serialize_raw_resource_description_to_dict,
@@ -49,25 +52,91 @@ with (Path(__file__).parent / "../animals.yaml").open(encoding="utf-8") as f:
 
 ADJECTIVES: Tuple[str] = tuple((Path(__file__).parent / "../adjectives.txt").read_text().split())
 
-# collect known nicknames independent of resource status (to avoid nickname conflicts if resources are unblocked)
-KNOWN_NICKNAMES = [
-    yaml.load(p).get("nickname") for p in (Path(__file__).parent / "../collection").glob("**/resource.yaml")
-]
-# note: may be appended to by 'get_animal_nickname'
 
+class UniquenessIndex:
+    """index of values that need to be unique across the collection together with the files specifying them"""
+
+    fields = ("nickname", "id", "doi")
+
+    def __init__(self):
+        self.sources: Dict[str, Dict[str, List[Path]]] = {f: {} for f in self.fields}
+
+    def add(self, field: str, value: str, source: Path):
+        sources = self.sources[field].setdefault(value, [])
+        if source not in sources:
+            sources.append(source)
+
+    def add_resource(self, info: Dict[str, Any], source: Path):
+        """add nickname, id and (concept and version) dois of a resource"""
+        for field in self.fields:
+            value = info.get(field)
+            if isinstance(value, str) and value:
+                self.add(field, value, source)
+
+        for v_info in info.get("versions", []):
+            doi = v_info.get("doi") if isinstance(v_info, dict) else None
+            if isinstance(doi, str) and doi:
+                self.add("doi", doi, source)
+
+    def get_sources(self, field: str, value: str) -> List[Path]:
+        return self.sources[field].get(value, [])
+
+    def is_taken(self, field: str, value: str, *, ignore_source: Optional[Path] = None) -> bool:
+        return any(s != ignore_source for s in self.get_sources(field, value))
+
+    def get_conflicts(self) -> List[str]:
+        return [
+            f"{field} '{value}' in {', '.join(map(str, sources))}"
+            for field, values in self.sources.items()
+            for value, sources in values.items()
+            if len(sources) > 1
+        ]
+
+    def raise_for_conflicts(self):
+        conflicts = self.get_conflicts()
+        if conflicts:
+            raise ValueError("Duplicate values:\n" + "\n".join(conflicts))
+
+
+def get_collection_index(collection: Path, exclude_status: Sequence[str] = ()) -> UniquenessIndex:
+    """index of resources in `collection` (built once per run; note: may be added to, e.g. by 'get_animal_nickname')
+
+    By default, resources are indexed independent of their status (to avoid nickname conflicts if resources are unblocked)
+    """
+    return _get_collection_index(collection.resolve(), tuple(exclude_status))
+
+
+@lru_cache
+def _get_collection_index(collection: Path, exclude_status: Tuple[str, ...]) -> UniquenessIndex:
+    index = UniquenessIndex()
+    for p in sorted(collection.glob("**/resource.yaml")):
+        info = yaml.load(p)
+        if info.get("status") not in exclude_status:
+            index.add_resource(info, p)
+
+    return index
+
+
+def get_animal_nickname(index: Optional[UniquenessIndex] = None, source: Optional[Path] = None) -> Tuple[str, str]:
+    """get animal nickname and associated icon
+
+    Args:
+        index: index of known nicknames (defaults to all nicknames in ../collection)
+        source: resource.yaml path to register the new nickname with in `index`
+    """
+    if index is None:
+        index = get_collection_index(Path(__file__).parent / "../collection")
 
-def get_animal_nickname() -> Tuple[str, str]:
-    """get animal nickname and associated icon"""
     for _ in range(100000):
         animal_adjective = numpy.random.choice(ADJECTIVES)
         animal_name = numpy.random.choice(list(ANIMALS.keys()))
         nickname = f"{animal_adjective}-{animal_name}"
-        if nickname not in KNOWN_NICKNAMES:
+        if not index.is_taken("nickname", nickname):
             break
     else:
         raise RuntimeError("Could not find free nickname")
 
-    KNOWN_NICKNAMES.append(nickname)
+    index.add("nickname", nickname, source or Path("unknown"))
     return nickname, ANIMALS[animal_name]
 
 
@@ -141,7 +210,7 @@ def resolve_partners(
                 ignored_partners.add(f"partner[{idx}]")
                 continue
 
-            r = requests.get(
+            r = http_get(
                 f"{ GH_API_URL }/repos/{ partner['repository'] }/commits/{ partner['branch'] }",
                 headers=dict(Accept="application/vnd.github.v3+json"),
             )
@@ -193,22 +262,118 @@ def resolve_partners(
     return partners, updated_partner_resources, new_partner_hashes, ignored_partners
 
 
+def canonicalize(data, block_style: bool = False, sort_keys: bool = True):
+    """copy of `data` with all dicts sorted by key (if `sort_keys`) and in block style (if `block_style`)
+
+    Nested dicts and lists are copied (iteratively, so arbitrarily deep data does not exhaust the stack);
+    other values are not copied. Block style (`CommentedMap`/`CommentedSeq`) does not work with YAML(typ='safe').
+    """
+    containers = (dict, list, tuple)
+    root = [data]
+    stack = [(data, root, 0)] if isinstance(data, containers) else []  # (source, target container, index or key)
+    # containers are filled as plain dicts/lists; other types are converted at the end (innermost first)
+    conversions = []
+    while stack:
+        obj, target, key = stack.pop()
+        if isinstance(obj, dict):
+            items = [(k, obj[k]) for k in sorted(obj)] if sort_keys else list(obj.items())
+            converted = dict(items)
+            if block_style:
+                conversions.append((target, key, comments.CommentedMap))
+        else:
+            converted = list.copy(obj) if isinstance(obj, list) else list(obj)  # (bypasses CommentedSeq.__iter__)
+            items = enumerate(converted)
+            if block_style and isinstance(obj, list):
+                conversions.append((target, key, comments.CommentedSeq))
+            elif type(obj) is not list:
+                conversions.append((target, key, type(obj)))
+
+        target[key] = converted
+        for k, v in items:
+            if isinstance(v, containers):
+                stack.append((v, converted, k))
+
+    for target, key, container_type in reversed(conversions):
+        converted = container_type(target[key])
+        if container_type in (comments.CommentedMap, comments.CommentedSeq):
+            converted.fa.set_block_style()
+
+        target[key] = converted
+
+    return root[0]
+
+
 def rec_sort(obj):
-    if isinstance(obj, dict):
-        return {k: rec_sort(obj[k]) for k in sorted(obj)}
-    elif isinstance(obj, (list, tuple)):
-        return type(obj)([rec_sort(v) for v in obj])
-    else:
-        return obj
+    return canonicalize(obj)
 
 
-def write_rdfs_for_resource(resource: dict, dist: Path, only_for_version_id: Optional[str] = None) -> List[str]:
+@dataclasses.dataclass
+class WriteCounts:
+    written: int = 0
+    skipped: int = 0
+
+    def __str__(self):
+        return f"{self.written} written, {self.skipped} unchanged (skipped)"
+
+
+def dump_yaml_if_changed(
+    data: Any,
+    path: Path,
+    *,
+    compare_to: Optional[Path] = None,
+    compare_sha256: Optional[str] = None,
+    dumper: YAML = yaml,
+    counts: Optional[WriteCounts] = None,
+) -> bool:
+    """serialize `data` once and write it to `path` only if it differs from the existing file
+
+    Args:
+        data: data to dump
+        path: output path
+        compare_to: file to compare with (defaults to `path`), e.g. the deployed file
+        compare_sha256: known sha256 of the file to compare with (avoids reading it)
+        dumper: yaml instance to serialize with
+        counts: optional counter of written and skipped files
+
+    Returns: True if `path` was written
+    """
+    stream = io.StringIO()
+    dumper.dump(data, stream)
+    serialized = stream.getvalue().encode("utf-8")
+    if compare_sha256 is None:
+        compare_to = compare_to or path
+        if compare_to.exists():
+            compare_sha256 = get_sha256(compare_to)
+
+    if sha256(serialized).hexdigest() == compare_sha256:
+        if counts is not None:
+            counts.skipped += 1
+
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(serialized)
+    if counts is not None:
+        counts.written += 1
+
+    return True
+
+
+def write_rdfs_for_resource(
+    resource: dict,
+    dist: Path,
+    only_for_version_id: Optional[str] = None,
+    gh_pages: Optional[Path] = None,
+    counts: Optional[WriteCounts] = None,
+) -> List[str]:
     """write updated version rdfs for the given resource to dist
 
     Args:
         resource: resource info
         dist: output path
         only_for_version_id: (if not None) only write rdf for specific version
+        gh_pages: (if not None) skip versions whose rdf is already deployed (and tested) with identical content
+        counts: optional counter of written and skipped rdfs
 
     Returns: list of updated version_ids
 
@@ -272,38 +437,38 @@ def write_rdfs_for_resource(resource: dict, dist: Path, only_for_version_id: Opt
         # sort rdf to avoid random diffs
         rdf = rec_sort(rdf)
 
-        updated_versions.append(version_id)
         rdf_deploy_path = dist / "rdfs" / resource_id / version_id / "rdf.yaml"
-        rdf_deploy_path.parent.mkdir(parents=True, exist_ok=True)
-        yaml.dump(rdf, rdf_deploy_path)
+        deployed_rdf_path = None if gh_pages is None else gh_pages / "rdfs" / resource_id / version_id / "rdf.yaml"
+        if deployed_rdf_path is None or not deployed_rdf_path.with_name("test_summary.yaml").exists():
+            deployed_rdf_path = rdf_deploy_path
+
+        written = dump_yaml_if_changed(rdf, rdf_deploy_path, compare_to=deployed_rdf_path, counts=counts)
+        if written or deployed_rdf_path == rdf_deploy_path:
+            updated_versions.append(version_id)
 
     return updated_versions
 
 
 def enforce_block_style_resource(resource: dict):
-    """enforce block style except for version:rdf_source, which might be an rdf dict"""
-    resource = rec_sort(copy.deepcopy(resource))
-
-    rdf_sources = [v.pop("rdf_source") for v in resource.get("versions", [])]
-    resource = enforce_block_style(resource)
-    assert len(rdf_sources) == len(resource.get("versions", []))
-    for i in range(len(rdf_sources)):
-        resource["versions"][i]["rdf_source"] = rdf_sources[i]
+    """sorted copy in block style except for version:rdf_source, which might be an rdf dict (and is kept last)"""
+    if "versions" not in resource:
+        return canonicalize(resource, block_style=True)
+
+    versions = resource["versions"]
+    rdf_sources = [v["rdf_source"] for v in versions]
+    resource = canonicalize(
+        dict(resource, versions=[{k: v for k, v in version.items() if k != "rdf_source"} for version in versions]),
+        block_style=True,
+    )
+    for version, rdf_source in zip(resource["versions"], rdf_sources):
+        version["rdf_source"] = canonicalize(rdf_source)
 
     return resource
 
 
 def enforce_block_style(data):
     """enforce block style in yaml data dump. Does not work with YAML(typ='safe')"""
-    if isinstance(data, list):
-        converted = comments.CommentedSeq([enforce_block_style(d) for d in data])
-    elif isinstance(data, dict):
-        converted = comments.CommentedMap({enforce_block_style(k): enforce_block_style(v) for k, v in data.items()})
-    else:
-        return data
-
-    converted.fa.set_block_style()
-    return converted
+    return canonicalize(data, block_style=True, sort_keys=False)
 
 
 @dataclasses.dataclass
@@ -434,13 +599,14 @@ def deploy_thumbnails(rdf_like: Dict[str, Any], dist: Path, gh_pages: Path, reso
                 # only cache badges stored on zenodo
                 continue
 
-            try:
-                downloaded_icon = Path(pooch.retrieve(icon, None, path=dist))  # type: ignore
-            except Exception as e:
-                warnings.warn(str(e))
-                continue
-
             icon_file_name = PurePosixPath(urlsplit(icon.strip("/content")).path).name
-            downsize_image(downloaded_icon, dist / icon_file_name, size=(320, 320))
+            if not (gh_pages / icon_file_name).exists():
+                try:
+                    downloaded_icon = Path(pooch.retrieve(icon, None, path=dist))  # type: ignore
+                except Exception as e:
+                    warnings.warn(str(e))
+                    continue
+
+                downsize_image(downloaded_icon, dist / icon_file_name, size=(320, 320))
 
             rdf_like["badges"][i]["icon"] = f"{DEPLOYED_BASE_URL}/rdfs/{resource_id}/{version_id}/{icon_file_name}"
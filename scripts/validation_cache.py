@@ -0,0 +1,166 @@
+"""cache of passed dynamic validation results keyed by a fingerprint of the test inputs
+
+The fingerprint of a dynamic test case covers the sha256 of its rdf.yaml, the sha256 of each weights file (as declared
+in the rdf or as found by `prefetch.py`), the canonical conda environment it is tested in and the tested weight
+format. Together with the bioimageio.core version a summary was produced with, it identifies a cached result.
+A cached result is reused if its core version is compatible with the installed one according to a policy:
+    exact: only the same core version
+    patch: any core version with the same major and minor version (patch releases are assumed not to change results)
+
+Only passed results are cached; failed test cases are re-tested (a patch release might fix them).
+Cached results are collected from the dynamic validation artifacts into the deployed test summary store
+(see `summary_store.py`) and handed to dynamic validation jobs as part of the static validation artifact.
+Only the standard library, packaging and bioimageio.spec are required (dynamic validation runs in the test environment).
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional
+
+from packaging.version import InvalidVersion, Version
+
+from bare_utils import PREFETCH_MANIFEST_FILE_NAME, get_sha256
+from bioimageio.spec.shared import yaml
+
+CORE_COMPATIBILITY_POLICIES = ("exact", "patch")
+DEFAULT_CORE_COMPATIBILITY = "patch"
+CACHED_RESULTS_FILE_NAME = "cached_dynamic_validation_results.json"  # in static validation artifact
+CACHE_ENTRY_FILE_NAME = "dynamic_validation_cache_entry.json"  # in dynamic validation artifact
+
+# weight formats without dynamic test cases
+UNTESTED_WEIGHT_FORMATS = ("keras_hdf5", "tensorflow_js")
+
+
+def is_compatible_core_version(cached: str, installed: str, policy: str = DEFAULT_CORE_COMPATIBILITY) -> bool:
+    if policy not in CORE_COMPATIBILITY_POLICIES:
+        raise ValueError(f"unknown core compatibility policy '{policy}'; choose from {CORE_COMPATIBILITY_POLICIES}")
+
+    if cached == installed:
+        return True
+    elif policy == "exact":
+        return False
+
+    try:
+        cached_v = Version(cached)
+        installed_v = Version(installed)
+    except InvalidVersion:
+        return False
+
+    return cached_v.release[:2] == installed_v.release[:2]
+
+
+def get_conda_env_sha256(env_path: Path) -> str:
+    """sha256 of the canonical json serialization of a conda environment (ignoring its name)"""
+    env = yaml.load(env_path)
+    if isinstance(env, dict):
+        env = {k: v for k, v in env.items() if k != "name"}
+
+    canonical = json.dumps(env, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get_weights_sha256(
+    rdf: Dict[str, Any], manifest: Optional[Dict[str, Any]] = None, version: Optional[str] = None
+) -> Dict[str, Optional[str]]:
+    """sha256 of each weights file (None if neither declared nor prefetched)
+
+    `version` (<resource_id>/<version_id>) maps (relative) weights sources to the prefetched uris in `manifest`.
+    """
+    prefetched = (manifest or {}).get("files", {})
+    uris = (manifest or {}).get("versions", {}).get(version) or {}
+    ret = {}
+    for wf, entry in (rdf.get("weights") or {}).items():
+        if not isinstance(entry, dict):
+            continue
+
+        sha256 = entry.get("sha256")
+        if sha256 is None:
+            source = entry.get("source")
+            sha256 = prefetched.get(uris.get(source, source), {}).get("sha256")
+
+        ret[wf] = sha256
+
+    return ret
+
+
+def get_fingerprint(
+    static_artifact: Path, resource_id: str, version_id: str, weight_format: str
+) -> Optional[Dict[str, Any]]:
+    """test inputs of a dynamic test case prepared in a static validation artifact
+
+    Returns None if a test input is unknown (the result of this test case cannot be cached).
+    """
+    rdf_path = static_artifact / resource_id / version_id / "rdf.yaml"
+    env_path = rdf_path.with_name(f"conda_env_{weight_format}.yaml")
+    if not rdf_path.exists() or not env_path.exists():
+        return None
+
+    rdf = yaml.load(rdf_path)
+    manifest_path = static_artifact / PREFETCH_MANIFEST_FILE_NAME
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else None
+    weights_sha256 = get_weights_sha256(rdf, manifest, f"{resource_id}/{version_id}")
+    if weights_sha256.get(weight_format) is None:
+        return None
+
+    return dict(
+        rdf_sha256=get_sha256(rdf_path),
+        weights_sha256=weights_sha256,
+        conda_env_sha256=get_conda_env_sha256(env_path),
+        weight_format=weight_format,
+    )
+
+
+def get_fingerprint_key(fingerprint: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def find_cached_summary(
+    cached_results: List[Dict[str, Any]],
+    fingerprint: Dict[str, Any],
+    core_version: str,
+    policy: str = DEFAULT_CORE_COMPATIBILITY,
+) -> Optional[Any]:
+    """summary of the cached result with matching fingerprint and the newest compatible core version"""
+    key = get_fingerprint_key(fingerprint)
+    candidates = [
+        c
+        for c in cached_results
+        if c["key"] == key and is_compatible_core_version(c["bioimageio_core_version"], core_version, policy)
+    ]
+    if not candidates:
+        return None
+
+    return max(candidates, key=lambda c: Version(c["bioimageio_core_version"]))["summary"]
+
+
+def is_covered(
+    cached_results: List[Dict[str, Any]],
+    rdf_sha256: str,
+    weight_formats: Collection[str],
+    core_version: str,
+    policy: str = DEFAULT_CORE_COMPATIBILITY,
+) -> bool:
+    """if all tested weight formats of an rdf have a cached result with a compatible core version
+
+    (used to decide about re-evaluation before conda environments are resolved; their hashes are not compared)
+    """
+    covered = {
+        c["fingerprint"]["weight_format"]
+        for c in cached_results
+        if c["fingerprint"]["rdf_sha256"] == rdf_sha256
+        and is_compatible_core_version(c["bioimageio_core_version"], core_version, policy)
+    }
+    return all(wf in covered for wf in weight_formats if wf not in UNTESTED_WEIGHT_FORMATS)
+
+
+def make_cache_entry(
+    resource_id: str, version_id: str, fingerprint: Dict[str, Any], core_version: str, summary: Any
+) -> Dict[str, Any]:
+    return dict(
+        key=get_fingerprint_key(fingerprint),
+        resource_id=resource_id,
+        version_id=version_id,
+        fingerprint=fingerprint,
+        bioimageio_core_version=core_version,
+        summary=summary,
+    )
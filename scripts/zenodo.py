@@ -0,0 +1,328 @@
+"""queries of the zenodo records API
+
+Search responses of paged queries are parsed as a stream: hits are decoded one at a time while the response is read.
+Harvesting all records splits the query into time windows that are streamed in parallel (`iterate_records_partitioned`).
+"""
+import codecs
+import json
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from itertools import islice
+from queue import Full, Queue
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import requests
+from http_client import http_get
+
+ZENODO_RECORDS_API = "https://zenodo.org/api/records"
+BIOIMAGEIO_QUERY = "keywords:bioimage.io"
+MAX_QUERY_RESULTS = 10_000  # zenodo does not page beyond the first 10k results of a query
+EARLIEST_RECORD = datetime(2019, 1, 1)  # no bioimage.io records were created before
+MIN_WINDOW = timedelta(minutes=1)
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]}"
+
+
+def iterate_text(r: requests.Response, chunk_size: int = 2**16) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")()
+    for chunk in r.iter_content(chunk_size):
+        yield decoder.decode(chunk)
+
+    yield decoder.decode(b"", final=True)
+
+
+def stream_json_array(chunks: Iterable[str], path: Sequence[str]) -> Iterator[Any]:
+    """yield the items of the json array at `path` (a sequence of object keys) one by one
+
+    Args:
+        chunks: json document as a stream of text chunks
+        path: object keys leading to the array, e.g. ("hits", "hits")
+    """
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+
+    def read_more() -> bool:
+        nonlocal buffer, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    # scan for the start of the array (tracking the object keys leading to the current position)
+    keys = []  # key of each open container (None for arrays)
+    last_string = None
+    while True:
+        if pos >= len(buffer) and not read_more():
+            raise ValueError(f"json array at {'/'.join(path)} not found")
+
+        c = buffer[pos]
+        if c == '"':
+            # read complete string
+            try:
+                last_string, end = json.decoder.scanstring(buffer, pos + 1)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+
+                continue
+
+            pos = end
+            continue
+        elif c == ":":
+            keys[-1] = last_string
+        elif c in "{[":
+            if c == "[" and keys == list(path):
+                pos += 1
+                break
+
+            keys.append(None)
+        elif c in "}]":
+            keys.pop()
+
+        pos += 1
+
+    # decode array items one by one
+    decoder = json.JSONDecoder()
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE + ",":
+            pos += 1
+
+        if pos >= len(buffer):
+            if not read_more():
+                raise ValueError(f"json array at {'/'.join(path)} not terminated")
+
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if not read_more():
+                raise
+
+            continue
+
+        if (end == len(buffer) or buffer[end] not in _DELIMITERS) and read_more():
+            continue  # the item (e.g. a number cut before its fraction or exponent) might continue in the next chunk
+
+        pos = end
+        yield item
+
+
+class IncompleteQueryError(RuntimeError):
+    """raised if not all records matching a query could be retrieved"""
+
+
+def iterate_record_pages(
+    q: str = BIOIMAGEIO_QUERY, *, sort: str = "newest", size: int = 1000, all_versions: bool = True
+) -> Iterator[Iterator[dict]]:
+    """hits of zenodo records matching query `q` page by page (stops at the first empty page)
+
+    Each page is an iterator over its hits, decoded while the response is streamed;
+    a page needs to be consumed before requesting the next one.
+    Raises `IncompleteQueryError` if a page cannot be retrieved.
+    """
+    for page in range(1, 1000):
+        zenodo_request = (
+            f"{ZENODO_RECORDS_API}?&sort={sort}&page={page}&size={size}&all_versions={int(all_versions)}"
+            f"&q={quote(q, safe=':')}"
+        )
+        r = http_get(zenodo_request, stream=True)
+        if not r.status_code == 200:
+            r.close()
+            raise IncompleteQueryError(f"Could not get zenodo records page {page}: {r.status_code}: {r.reason}")
+
+        print(f"Collecting items from zenodo: {zenodo_request}")
+        n_hits = 0
+
+        def iterate_hits():
+            nonlocal n_hits
+            for hit in stream_json_array(iterate_text(r), ("hits", "hits")):
+                n_hits += 1
+                yield hit
+
+        try:
+            yield iterate_hits()
+        finally:
+            r.close()
+
+        if not n_hits:
+            break
+
+
+def get_record_page(
+    q: str, page: int, *, sort: str = "newest", size: int = 1000, all_versions: bool = True
+) -> Dict[str, Any]:
+    r = http_get(
+        f"{ZENODO_RECORDS_API}?&sort={sort}&page={page}&size={size}&all_versions={int(all_versions)}"
+        f"&q={quote(q, safe=':')}"
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+def get_window_query(q: str, start: datetime, end: datetime) -> str:
+    """restrict query `q` to records created in [start, end)"""
+    return f'({q}) AND created:["{start.isoformat()}" TO "{end.isoformat()}"}}'
+
+
+def count_window(q: str, start: datetime, end: datetime) -> int:
+    """number of records created in [start, end)"""
+    return get_record_page(get_window_query(q, start, end), 1, size=1)["hits"]["total"]
+
+
+def iterate_window_pages(q: str, start: datetime, end: datetime, size: int, expected: int) -> Iterator[List[dict]]:
+    """pages of hits of records created in [start, end), newest first
+
+    Raises `IncompleteQueryError` (after the last page) if fewer than `expected` records were retrieved.
+    """
+    n_hits = 0
+    for page in iterate_record_pages(get_window_query(q, start, end), size=size):
+        hits = list(page)
+        n_hits += len(hits)
+        yield hits
+        if len(hits) < size:
+            break  # last page
+
+    if n_hits < expected:
+        raise IncompleteQueryError(f"got {n_hits} of {expected} records")
+
+
+_END_OF_WINDOW = object()
+
+
+def put_window_pages(pages: Iterator[List[dict]], queue: Queue, stop: threading.Event):
+    """put `pages` into `queue`, followed by `_END_OF_WINDOW` or the raised exception (gives up once `stop` is set)
+
+    A page is only requested once the previous one was taken from `queue` (if it holds a single page).
+    """
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+            except Full:
+                continue
+
+            return True
+
+        return False
+
+    try:
+        for page in pages:
+            if not put(page):
+                return
+    except Exception as e:
+        put(e)
+    else:
+        put(_END_OF_WINDOW)
+
+
+def partition_time_range(
+    q: str, start: datetime, end: datetime, n_windows: int, max_hits: int, executor: ThreadPoolExecutor
+) -> List[Tuple[datetime, datetime, int]]:
+    """(start, end, count) of non-empty windows with at most `max_hits` records covering [start, end), newest first
+
+    Windows are counted in parallel; windows with too many records (to page through) are split in half until they fit.
+    """
+    step = (end - start) / n_windows
+    bounds = [(start + i * step).replace(microsecond=0) for i in range(n_windows)] + [end]
+    pending = {executor.submit(count_window, q, s, e): (s, e) for s, e in zip(bounds[:-1], bounds[1:])}
+    windows = []
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window_start, window_end = pending.pop(future)
+                try:
+                    count = future.result()
+                except Exception as e:
+                    raise IncompleteQueryError(
+                        f"Could not count zenodo records created in [{window_start}, {window_end}): {e}"
+                    ) from e
+
+                if count > max_hits and window_end - window_start > MIN_WINDOW:
+                    middle = (window_start + (window_end - window_start) / 2).replace(microsecond=0)
+                    for s, e in [(window_start, middle), (middle, window_end)]:
+                        pending[executor.submit(count_window, q, s, e)] = (s, e)
+                elif count:
+                    windows.append((window_start, window_end, count))
+    finally:
+        for future in pending:
+            future.cancel()
+
+    return sorted(windows, reverse=True)
+
+
+def iterate_records_partitioned(
+    q: str = BIOIMAGEIO_QUERY,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    *,
+    n_windows: int = 8,
+    max_workers: int = 4,
+    size: int = 1000,
+    max_hits: int = MAX_QUERY_RESULTS,
+) -> Iterator[dict]:
+    """hits of zenodo records matching query `q` created in [start, end), newest first and deduplicated by record id
+
+    The time range is split into windows of at most `max_hits` records (see `partition_time_range`), which are
+    streamed in parallel by up to `max_workers` workers. Hits are yielded window by window, page by page as the pages
+    arrive; workers of the next windows hold at most two pages each until their window is yielded.
+    If a window fails, `IncompleteQueryError` is raised (after all hits of newer windows and pages were yielded).
+    """
+    start = start or EARLIEST_RECORD
+    end = end or datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    seen_ids = set()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        windows = iter(partition_time_range(q, start, end, n_windows, max_hits, executor))
+        in_flight: Deque[Tuple[datetime, datetime, Queue, Future]] = deque()
+
+        def submit_next():
+            for window_start, window_end, count in islice(windows, 1):
+                queue = Queue(maxsize=1)
+                pages = iterate_window_pages(q, window_start, window_end, size, count)
+                future = executor.submit(put_window_pages, pages, queue, stop)
+                in_flight.append((window_start, window_end, queue, future))
+
+        for _ in range(max_workers):
+            submit_next()
+
+        try:
+            while in_flight:
+                window_start, window_end, queue, future = in_flight[0]
+                n_hits = 0
+                for page in iter(queue.get, _END_OF_WINDOW):
+                    if isinstance(page, Exception):
+                        raise IncompleteQueryError(
+                            f"Could not get zenodo records created in [{window_start}, {window_end}): {page}"
+                        ) from page
+
+                    n_hits += len(page)
+                    for hit in page:
+                        if hit["id"] not in seen_ids:
+                            seen_ids.add(hit["id"])
+                            yield hit
+
+                in_flight.popleft()
+                submit_next()
+                print(f"Collected {n_hits} items from zenodo created in [{window_start}, {window_end})")
+        finally:
+            stop.set()
+            for _, _, _, future in in_flight:
+                future.cancel()
+
+
+def get_concept_doi_query(concept_dois: Sequence[str]) -> str:
+    return " OR ".join(f'conceptdoi:"{doi}"' for doi in concept_dois)